@@ -0,0 +1,162 @@
+# answer_cache.py
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Answers to /ask/ questions, keyed on document version and question. On an
+# exact miss, a cached question whose embedding has cosine similarity of at
+# least ANSWER_CACHE_SIMILARITY is treated as the same question.
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", os.path.join(".cache", "answers.sqlite3"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_MAX_PER_DOCUMENT = int(os.getenv("ANSWER_CACHE_MAX_PER_DOCUMENT", "500"))
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"[\s?.!]+$", "", " ".join(question.lower().split()))
+
+
+class AnswerCache:
+    """
+    Persistent exact + semantic answer cache, invalidated per document.
+    """
+
+    def __init__(self, path: str = ANSWER_CACHE_PATH, similarity: float = ANSWER_CACHE_SIMILARITY):
+        self.similarity = similarity
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+        self._lock = threading.Lock()
+        self._matrices = {}  # doc -> (row ids, normalised embedding matrix)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS versions (doc TEXT PRIMARY KEY, version INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                doc TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB,
+                answer TEXT NOT NULL,
+                latency_ms REAL NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS answers_doc_question ON answers (doc, version, question);
+            """
+        )
+        self._db.commit()
+
+    def _version(self, doc: str) -> int:
+        row = self._db.execute("SELECT version FROM versions WHERE doc = ?", (doc,)).fetchone()
+        return row[0] if row else 0
+
+    def invalidate(self, doc: str):
+        """
+        Drops every cached answer for a document and bumps its version.
+        """
+        with self._lock:
+            version = self._version(doc) + 1
+            self._db.execute("INSERT OR REPLACE INTO versions (doc, version) VALUES (?, ?)", (doc, version))
+            self._db.execute("DELETE FROM answers WHERE doc = ?", (doc,))
+            self._db.commit()
+            self._matrices.pop(doc, None)
+
+    def _hit(self, kind: str, answer: str, latency_ms: float) -> str:
+        if kind == "exact":
+            self.exact_hits += 1
+        else:
+            # The semantic lookup follows an exact miss, which it turns into a hit.
+            self.misses -= 1
+            self.semantic_hits += 1
+        self.latency_saved_ms += latency_ms
+        return answer
+
+    def get_exact(self, doc: str, question: str):
+        """
+        Returns the cached answer to the same (normalized) question, if any. Every
+        lookup starts here, so a miss is counted here; a following get_similar()
+        hit turns it into a semantic hit.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT answer, latency_ms FROM answers WHERE doc = ? AND version = ? AND question = ? LIMIT 1",
+                (doc, self._version(doc), normalize_question(question)),
+            ).fetchone()
+            if row:
+                return self._hit("exact", *row)
+            self.misses += 1
+            return None
+
+    def _matrix(self, doc: str, version: int):
+        cached = self._matrices.get(doc)
+        if cached is None:
+            rows = self._db.execute(
+                "SELECT id, embedding FROM answers WHERE doc = ? AND version = ? AND embedding IS NOT NULL",
+                (doc, version),
+            ).fetchall()
+            ids = [row_id for row_id, _ in rows]
+            if rows:
+                matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+                matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            else:
+                matrix = None
+            cached = (ids, matrix)
+            self._matrices[doc] = cached
+        return cached
+
+    def get_similar(self, doc: str, embedding):
+        """
+        Returns the answer to the most similar cached question above the threshold, if any.
+        Called after a get_exact() miss, which has already been counted.
+        """
+        if embedding is None:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            ids, matrix = self._matrix(doc, self._version(doc))
+            if matrix is not None and matrix.shape[1] == query.shape[0]:
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    row = self._db.execute("SELECT answer, latency_ms FROM answers WHERE id = ?",
+                                           (ids[best],)).fetchone()
+                    if row:
+                        return self._hit("semantic", *row)
+            return None
+
+    def put(self, doc: str, question: str, embedding, answer: str, latency_ms: float):
+        blob = np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+        with self._lock:
+            version = self._version(doc)
+            self._db.execute(
+                "INSERT INTO answers (doc, version, question, embedding, answer, latency_ms, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (doc, version, normalize_question(question), blob, answer, latency_ms, time.time()),
+            )
+            self._db.execute(
+                "DELETE FROM answers WHERE doc = ? AND id NOT IN "
+                "(SELECT id FROM answers WHERE doc = ? ORDER BY id DESC LIMIT ?)",
+                (doc, doc, ANSWER_CACHE_MAX_PER_DOCUMENT),
+            )
+            self._db.commit()
+            self._matrices.pop(doc, None)
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 1),
+        }
@@ -0,0 +1,190 @@
+# catalog.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# One row per indexed document, maintained by ChromaHandler on every add and
+# delete so listings never have to scan the chunks in the vector store. The
+# content hash of every stored chunk is kept alongside, by chunk index, so a
+# re-ingest only has to embed and write the chunks that changed.
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(".cache", "catalog.sqlite3"))
+# The catalog is local to the machine while the collection is shared, so it is
+# reconciled against a full scan of the collection every CATALOG_RECONCILE_SECONDS
+# (0 disables the periodic scan), and on a miss for a single document.
+CATALOG_RECONCILE_SECONDS = float(os.getenv("CATALOG_RECONCILE_SECONDS", "300"))
+
+CATALOG_FIELDS = ("title_slug", "filename", "content_hash", "chunk_count", "page_count", "byte_size", "ingested_at")
+_SORTABLE = {"title_slug", "filename", "chunk_count", "page_count", "byte_size", "ingested_at"}
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DocumentCatalog:
+    """
+    SQLite-backed catalog of the documents in the vector store.
+    """
+
+    def __init__(self, path: str = CATALOG_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                title_slug TEXT PRIMARY KEY,
+                filename TEXT,
+                content_hash TEXT,
+                chunk_count INTEGER NOT NULL DEFAULT 0,
+                page_count INTEGER,
+                byte_size INTEGER,
+                ingested_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunk_hashes (
+                title_slug TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (title_slug, chunk_index)
+            );
+            CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(documents)")}
+        if "hidden" not in columns:
+            # Hidden documents (e.g. indexed from a URL) are left out of listings and library-wide retrieval.
+            self._db.execute("ALTER TABLE documents ADD COLUMN hidden INTEGER NOT NULL DEFAULT 0")
+        self._db.commit()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            self._db.commit()
+            return cursor
+
+    def reconciled_at(self):
+        """
+        When the catalog was last reconciled against the collection, or None if never.
+        """
+        row = self._execute("SELECT value FROM catalog_meta WHERE key = 'reconciled_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def mark_reconciled(self, at: float):
+        self._execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('reconciled_at', ?)", (str(at),))
+
+    def reset_document(self, title_slug: str):
+        """
+        Starts a fresh record for a document being (re-)ingested.
+        """
+        self._execute("DELETE FROM chunk_hashes WHERE title_slug = ?", (title_slug,))
+        # Everything but the hidden flag is reset.
+        self._execute(
+            "INSERT INTO documents (title_slug, chunk_count, ingested_at) VALUES (?, 0, ?) "
+            "ON CONFLICT(title_slug) DO UPDATE SET filename = NULL, content_hash = NULL, chunk_count = 0, "
+            "page_count = NULL, byte_size = NULL, ingested_at = excluded.ingested_at",
+            (title_slug, time.time()),
+        )
+
+    def set_hidden(self, title_slug: str, hidden: bool = True):
+        self._execute(
+            "INSERT INTO documents (title_slug, ingested_at, hidden) VALUES (?, ?, ?) "
+            "ON CONFLICT(title_slug) DO UPDATE SET hidden = excluded.hidden",
+            (title_slug, time.time(), int(hidden)),
+        )
+
+    def is_hidden(self, title_slug: str) -> bool:
+        row = self._execute("SELECT hidden FROM documents WHERE title_slug = ?", (title_slug,)).fetchone()
+        return bool(row and row[0])
+
+    def hidden_titles(self) -> list:
+        return [slug for (slug,) in self._execute("SELECT title_slug FROM documents WHERE hidden ORDER BY title_slug")]
+
+    def add_chunks(self, title_slug: str, count: int):
+        self._execute(
+            "INSERT INTO documents (title_slug, chunk_count, ingested_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(title_slug) DO UPDATE SET chunk_count = chunk_count + excluded.chunk_count",
+            (title_slug, count, time.time()),
+        )
+
+    def update_document(self, title_slug: str, **fields):
+        """
+        Sets descriptive fields (filename, content_hash, page_count, byte_size, chunk_count).
+        """
+        fields = {key: value for key, value in fields.items() if key in CATALOG_FIELDS and key != "title_slug"}
+        if not fields:
+            return
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        self._execute(f"UPDATE documents SET {assignments} WHERE title_slug = ?", (*fields.values(), title_slug))
+
+    def set_chunk_hashes(self, title_slug: str, hashes: dict):
+        """
+        Records {chunk_index: hash} for chunks that were just written.
+        """
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunk_hashes (title_slug, chunk_index, hash) VALUES (?, ?, ?)",
+                [(title_slug, index, chunk_hash) for index, chunk_hash in hashes.items()],
+            )
+            self._db.commit()
+
+    def chunk_hashes(self, title_slug: str) -> list:
+        """
+        Returns the stored chunk hashes of a document in chunk order.
+        """
+        rows = self._execute("SELECT chunk_index, hash FROM chunk_hashes WHERE title_slug = ? ORDER BY chunk_index",
+                             (title_slug,)).fetchall()
+        # A gap means an earlier ingest stopped part-way; only the prefix is trustworthy.
+        hashes = []
+        for index, chunk_hash in rows:
+            if index != len(hashes):
+                break
+            hashes.append(chunk_hash)
+        return hashes
+
+    def truncate_chunks(self, title_slug: str, chunk_count: int):
+        """
+        Forgets the hashes of chunks at or beyond chunk_count and records the new count.
+        """
+        self._execute("DELETE FROM chunk_hashes WHERE title_slug = ? AND chunk_index >= ?", (title_slug, chunk_count))
+        self._execute("UPDATE documents SET chunk_count = ? WHERE title_slug = ?", (chunk_count, title_slug))
+
+    def delete(self, title_slug: str):
+        self._execute("DELETE FROM documents WHERE title_slug = ?", (title_slug,))
+        self._execute("DELETE FROM chunk_hashes WHERE title_slug = ?", (title_slug,))
+
+    def get(self, title_slug: str):
+        row = self._execute(f"SELECT {', '.join(CATALOG_FIELDS)} FROM documents WHERE title_slug = ?",
+                            (title_slug,)).fetchone()
+        return dict(zip(CATALOG_FIELDS, row)) if row else None
+
+    def chunk_counts(self) -> dict:
+        """
+        Returns {title_slug: chunk_count} for every entry, hidden ones included.
+        """
+        return dict(self._execute("SELECT title_slug, chunk_count FROM documents").fetchall())
+
+    def titles(self) -> list:
+        return [slug for (slug,) in self._execute("SELECT title_slug FROM documents WHERE NOT hidden ORDER BY title_slug")]
+
+    def list(self, offset: int = 0, limit: int = 50, query: str = None, sort: str = "title_slug",
+             descending: bool = False) -> dict:
+        """
+        Returns a page of the visible catalog entries, optionally filtered by a substring of the slug or filename.
+        """
+        sort = sort if sort in _SORTABLE else "title_slug"
+        where = "WHERE NOT hidden"
+        params = []
+        if query:
+            where += " AND (title_slug LIKE ? OR filename LIKE ?)"
+            params = [f"%{query}%", f"%{query}%"]
+        (total,) = self._execute(f"SELECT COUNT(*) FROM documents {where}", params).fetchone()
+        rows = self._execute(
+            f"SELECT {', '.join(CATALOG_FIELDS)} FROM documents {where} "
+            f"ORDER BY {sort} {'DESC' if descending else 'ASC'} LIMIT ? OFFSET ?",
+            (*params, limit, offset),
+        ).fetchall()
+        return {"total": total, "offset": offset, "limit": limit,
+                "documents": [dict(zip(CATALOG_FIELDS, row)) for row in rows]}
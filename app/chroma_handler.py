@@ -1,80 +1,369 @@
 import hashlib
+import logging
 import os
 import re
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
 
-import chromadb
 from dotenv import load_dotenv
 
+from app.catalog import CATALOG_RECONCILE_SECONDS, DocumentCatalog, chunk_hash
+from app.clients import get_collection
+from app.document_store import DocumentStore
+from app.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.metrics import span
+
 # Load environment variables
 load_dotenv()
 
-# The Chroma server host and port must be set as environment variables
-# in your App Runner service configuration. The host is the public IP
-# address of the EC2 instance you launched.
-chroma_host = os.getenv("CHROMA_SERVER_HOST")
-chroma_port = os.getenv("CHROMA_SERVER_PORT", "8000")
-
-# Ensure the host is set before attempting to create the client.
-# This check prevents the application from crashing if the environment variable is missing.
-if not chroma_host:
-    raise ValueError(
-        "CHROMA_SERVER_HOST environment variable is not set. Please set it to the public IP of your EC2 instance.")
-
-# Use HttpClient to connect to the remote ChromaDB server.
-# This client will communicate with the Chroma instance running on your EC2 machine.
-# This code handles potential connection errors.
-try:
-    client = chromadb.HttpClient(
-        host=chroma_host,
-        port=int(chroma_port)
-    )
-    print(f"Successfully connected to ChromaDB at http://{chroma_host}:{chroma_port}")
-except Exception as e:
-    # If the connection fails, log the error and re-raise it to halt the application.
-    # This is important for App Runner's health checks to detect a failed startup.
-    print(f"Failed to connect to ChromaDB at http://{chroma_host}:{chroma_port}. Error: {e}")
-    raise ConnectionError(f"Could not connect to ChromaDB: {e}")
-
-# Get or create the collection for storing your papers.
-collection = client.get_or_create_collection("papers")
+# Vector store backend: "chroma" (remote Chroma server, the default), "memory"
+# (ephemeral in-process Chroma) or "local" (in-process memory-mapped index,
+# see app/vector_store.py).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+
+
+def _connect_chroma_collection():
+    import chromadb
+
+    # The Chroma server host and port must be set as environment variables
+    # in your App Runner service configuration. The host is the public IP
+    # address of the EC2 instance you launched.
+    chroma_host = os.getenv("CHROMA_SERVER_HOST")
+    chroma_port = os.getenv("CHROMA_SERVER_PORT", "8000")
+
+    # Ensure the host is set before attempting to create the client.
+    # This check prevents the application from crashing if the environment variable is missing.
+    if not chroma_host:
+        raise ValueError(
+            "CHROMA_SERVER_HOST environment variable is not set. Please set it to the public IP of your EC2 instance.")
+
+    # Use HttpClient to connect to the remote ChromaDB server.
+    # This client will communicate with the Chroma instance running on your EC2 machine.
+    # This code handles potential connection errors.
+    try:
+        client = chromadb.HttpClient(
+            host=chroma_host,
+            port=int(chroma_port)
+        )
+        print(f"Successfully connected to ChromaDB at http://{chroma_host}:{chroma_port}")
+    except Exception as e:
+        # If the connection fails, log the error and re-raise it to halt the application.
+        # This is important for App Runner's health checks to detect a failed startup.
+        print(f"Failed to connect to ChromaDB at http://{chroma_host}:{chroma_port}. Error: {e}")
+        raise ConnectionError(f"Could not connect to ChromaDB: {e}")
+
+    # Get or create the collection for storing your papers.
+    return client.get_or_create_collection("papers")
+
+
+def create_collection(backend: str = VECTOR_BACKEND):
+    """
+    Returns a collection object with Chroma's add/query/get/delete surface for the configured backend.
+    """
+    if backend == "local":
+        from app.vector_store import LocalCollection
+        return LocalCollection()
+    if backend == "chroma":
+        return _connect_chroma_collection()
+    if backend == "memory":
+        # Ephemeral in-process Chroma, for development and the offline benchmarks.
+        import chromadb
+        return chromadb.EphemeralClient().get_or_create_collection("papers")
+    raise ValueError(f"Unknown VECTOR_BACKEND '{backend}'. Expected 'chroma', 'memory' or 'local'.")
+
+
+# Hybrid retrieval: documents whose best BM25 hit outscores the runner-up by
+# this factor are answered from the lexical index alone, skipping the query
+# embedding. Set to 0 to always fuse with vector results.
+HYBRID_DECISIVE_RATIO = float(os.getenv("HYBRID_DECISIVE_RATIO", "2.0"))
+HYBRID_DECISIVE_MIN_SCORE = float(os.getenv("HYBRID_DECISIVE_MIN_SCORE", "5.0"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+# Writes to the vector store are split into batches bounded by chunk count and
+# by estimated request size (texts plus JSON-encoded embeddings), and a failed
+# batch is retried on its own.
+STORE_BATCH_SIZE = int(os.getenv("STORE_BATCH_SIZE", "256"))
+STORE_MAX_BATCH_BYTES = int(os.getenv("STORE_MAX_BATCH_BYTES", str(4 * 1024 * 1024)))
+STORE_MAX_RETRIES = int(os.getenv("STORE_MAX_RETRIES", "3"))
+STORE_RETRY_BACKOFF = float(os.getenv("STORE_RETRY_BACKOFF", "0.5"))
+# A float serialised as JSON ("-0.012345678901234567, ") takes about this many bytes.
+EMBEDDING_JSON_BYTES_PER_VALUE = 22
+# Chunk metadata is read this many records at a time when reconciling the catalog.
+CATALOG_RECONCILE_PAGE_SIZE = 5000
+
+
+class StoreError(RuntimeError):
+    """Raised when a batch of chunks could not be written after all retries."""
+
+
+def estimate_record_bytes(chunk: str, embedding) -> int:
+    return len(chunk.encode("utf-8")) + len(embedding) * EMBEDDING_JSON_BYTES_PER_VALUE + 64
+
+
+def pack_store_batches(chunks: list, embeddings: list, batch_size: int = STORE_BATCH_SIZE,
+                       max_batch_bytes: int = STORE_MAX_BATCH_BYTES) -> list:
+    """
+    Packs records into contiguous batches bounded by item count and estimated request bytes.
+
+    Returns:
+        list: (start_index, end_index) pairs covering the records in order.
+    """
+    batches = []
+    start = 0
+    size = 0
+    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        cost = estimate_record_bytes(chunk, embedding)
+        if i > start and (i - start >= batch_size or size + cost > max_batch_bytes):
+            batches.append((start, i))
+            start = i
+            size = 0
+        size += cost
+    if start < len(chunks):
+        batches.append((start, len(chunks)))
+    return batches
 
 
 class ChromaHandler:
-    def __init__(self):
-        self.collection = collection
+    def __init__(self, vector_collection=None):
+        # Without an explicit collection, the shared one is connected on first use.
+        self._collection = vector_collection
+        self.lexical_index = LexicalIndex()
+        self.catalog = DocumentCatalog()
+        self.document_store = DocumentStore()
+        self._invalidation_listeners = []
+        self._writes_lock = threading.Lock()
+        self._writing = {}  # title_slug -> writes in progress in this process
+        self._written_at = {}  # title_slug -> when the last write in this process finished
+        self._reconcile_lock = threading.Lock()
+        self._reconciler = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = get_collection()
+        return self._collection
+
+    def add_invalidation_listener(self, listener):
+        """
+        Registers listener(title_slug), called whenever a document is re-ingested or deleted.
+        """
+        self._invalidation_listeners.append(listener)
+
+    def _notify_invalidated(self, title_slug: str):
+        for listener in self._invalidation_listeners:
+            listener(title_slug)
 
     def _generate_title_slug(self, title: str):
         words = re.findall(r'\w+', title)[:5]
         return "_".join(words).lower()
 
-    def add_chunks_with_embeddings_to_chroma(self, chunks: list, embeddings: list, doc_title: str):
+    def begin_document(self, doc_title: str, reset: bool = True):
         """
-        Adds a document's chunks and pre-computed embeddings to the Chroma collection.
-        This method assumes the chunks are already generated.
+        Prepares a document for (re-)ingestion by removing any existing chunks.
+        Returns the title slug that chunk batches should be written under.
+        Pass reset=False to keep chunks already written by an interrupted ingest.
         """
         title_slug = self._generate_title_slug(doc_title)
+        if not reset:
+            return title_slug
 
         # Delete existing documents with the same title to avoid duplicates.
-        existing_docs = self.collection.get(where={"doc_title": title_slug})
-        if existing_docs:
+        # One id is enough to tell, so nothing else is fetched.
+        existing = self.collection.get(where={"doc_title": title_slug}, limit=1, include=[])
+        if existing["ids"]:
             self.collection.delete(where={"doc_title": title_slug})
+        self.lexical_index.delete(title_slug)
+        self.catalog.reset_document(title_slug)
+        self.document_store.delete(title_slug)
+        self._notify_invalidated(title_slug)
+        return title_slug
 
-        ids = [f"{title_slug}_chunk_{i}" for i in range(len(chunks))]
-        metadata = [{"doc_title": title_slug} for _ in chunks]
+    def find_document(self, doc_title: str):
+        """
+        Returns the title slug for doc_title and its catalog entry, or None if it is not indexed.
+        A catalog miss is checked against the collection, which another process may have written.
+        """
+        title_slug = self._generate_title_slug(doc_title)
+        entry = self.catalog.get(title_slug)
+        if entry is None and self._import_document(title_slug):
+            entry = self.catalog.get(title_slug)
+        return title_slug, entry
 
-        self.collection.add(
-            embeddings=embeddings,
-            documents=chunks,
-            ids=ids,
-            metadatas=metadata
+    @contextmanager
+    def writing(self, title_slug: str):
+        """
+        Marks a document as being written by this process, so catalog
+        reconciliation leaves its entry alone until the write is over.
+        """
+        with self._writes_lock:
+            self._writing[title_slug] = self._writing.get(title_slug, 0) + 1
+        try:
+            yield
+        finally:
+            with self._writes_lock:
+                self._writing[title_slug] -= 1
+                if not self._writing[title_slug]:
+                    del self._writing[title_slug]
+                self._written_at[title_slug] = time.time()
+
+    def _busy_since(self, started: float) -> set:
+        """
+        Documents being written, or written since `started`, by this process.
+        """
+        with self._writes_lock:
+            for title_slug in [slug for slug, at in self._written_at.items() if at < started]:
+                del self._written_at[title_slug]
+            return set(self._writing) | set(self._written_at)
+
+    def _import_document(self, title_slug: str) -> bool:
+        """
+        Adds a catalog entry for a document found in the collection but not in the catalog.
+        """
+        results = self.collection.get(where={"doc_title": title_slug}, include=["metadatas"])
+        if not results["ids"]:
+            return False
+        with self._writes_lock:
+            if title_slug in self._writing:
+                return False
+        self.catalog.reset_document(title_slug)
+        self.catalog.update_document(title_slug, chunk_count=len(results["ids"]))
+        if any(metadata and metadata.get("hidden") for metadata in results["metadatas"]):
+            self.catalog.set_hidden(title_slug)
+        logging.info(f"Added '{title_slug}' to the catalog from the collection.")
+        return True
+
+    def hide_document(self, title_slug: str):
+        """
+        Keeps a document out of listings and library-wide retrieval; it stays
+        reachable by its title slug. Set before ingesting so it is never listed.
+        """
+        self.catalog.set_hidden(title_slug)
+
+    def _library_filter(self) -> dict:
+        """
+        Where clause for library-wide queries, excluding hidden documents.
+        """
+        hidden = self.catalog.hidden_titles()
+        return {"doc_title": {"$nin": hidden}} if hidden else {}
+
+    def get_chunk_hashes(self, title_slug: str) -> list:
+        return self.catalog.chunk_hashes(title_slug)
+
+    def _add_with_retry(self, ids: list, chunks: list, embeddings: list, metadatas: list, replace: bool):
+        """
+        Writes one store batch. A retried batch first deletes its own ids, so a
+        write that partly succeeded before failing is not duplicated.
+        """
+        attempt = 0
+        while True:
+            try:
+                if replace or attempt:
+                    self.collection.delete(ids=ids)
+                self.collection.add(embeddings=embeddings, documents=chunks, ids=ids, metadatas=metadatas)
+                return
+            except Exception as e:
+                attempt += 1
+                if attempt > STORE_MAX_RETRIES:
+                    raise StoreError(f"Writing a batch of {len(ids)} chunks failed: {e}") from e
+                delay = STORE_RETRY_BACKOFF * (2 ** (attempt - 1))
+                logging.warning(f"Store batch failed (attempt {attempt}/{STORE_MAX_RETRIES}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def add_chunk_batch(self, title_slug: str, chunks: list, embeddings: list, start_index: int = 0,
+                        indexes: list = None, replace: bool = False):
+        """
+        Adds a batch of chunks, numbering ids from start_index or by the given chunk indexes.
+        With replace=True, chunks already stored under those ids are overwritten.
+        Large batches are written as several size-bounded requests.
+
+        Raises:
+            StoreError: If a request still fails after STORE_MAX_RETRIES retries.
+        """
+        indexes = list(indexes) if indexes is not None else list(range(start_index, start_index + len(chunks)))
+        ids = [f"{title_slug}_chunk_{i}" for i in indexes]
+        # The hidden flag is stored with the chunks too, so a catalog rebuilt from the collection keeps it.
+        hidden = self.catalog.is_hidden(title_slug)
+        metadata = [{"doc_title": title_slug, "hidden": True} if hidden else {"doc_title": title_slug}
+                    for _ in chunks]
+
+        with span("store", payload_bytes=sum(len(chunk) for chunk in chunks)):
+            if replace:
+                self.lexical_index.delete_chunks(title_slug, ids)
+            for start, end in pack_store_batches(chunks, embeddings):
+                self._add_with_retry(ids[start:end], chunks[start:end], embeddings[start:end],
+                                     metadata[start:end], replace)
+            self.lexical_index.add(title_slug, ids, chunks)
+        if not replace:
+            self.catalog.add_chunks(title_slug, len(chunks))
+        self.catalog.set_chunk_hashes(title_slug, {i: chunk_hash(chunk) for i, chunk in zip(indexes, chunks)})
+
+    def finish_document(self, title_slug: str, chunk_count: int, changed: bool = True):
+        """
+        Removes chunks left over from a longer previous version of the document
+        and records its final chunk count. Listeners are notified if anything changed.
+        """
+        entry = self.catalog.get(title_slug)
+        previous_count = max(entry["chunk_count"] if entry else 0, len(self.catalog.chunk_hashes(title_slug)))
+        stale_ids = [f"{title_slug}_chunk_{i}" for i in range(chunk_count, previous_count)]
+        if stale_ids:
+            self.collection.delete(ids=stale_ids)
+            self.lexical_index.delete_chunks(title_slug, stale_ids)
+        self.lexical_index.save(title_slug)
+        self.catalog.truncate_chunks(title_slug, chunk_count)
+        if changed or stale_ids:
+            self._notify_invalidated(title_slug)
+
+    def update_document_details(self, title_slug: str, **details):
+        """
+        Records descriptive catalog fields for a document: filename, content_hash,
+        page_count and byte_size.
+        """
+        self.catalog.update_document(title_slug, **details)
+
+    def add_chunks_with_embeddings_to_chroma(self, chunks: list, embeddings, doc_title: str):
+        """
+        Adds a document's chunks and their embeddings to the Chroma collection.
+        This method assumes the chunks are already generated. When the document is
+        already indexed, only chunks whose content changed are rewritten.
+
+        embeddings may be any iterable in chunk order, such as a generator that
+        yields them as embedding calls complete: every STORE_BATCH_SIZE chunks
+        are written as soon as their embeddings arrive, while later ones are
+        still being computed.
+        """
+        title_slug, entry = self.find_document(doc_title)
+        with self.writing(title_slug):
+            return self._add_chunks(chunks, embeddings, doc_title, title_slug, entry)
+
+    def _add_chunks(self, chunks: list, embeddings, doc_title: str, title_slug: str, entry):
+        previous = self.catalog.chunk_hashes(title_slug) if entry else []
+        incremental = bool(previous) and len(previous) >= entry["chunk_count"]
+        if not incremental:
+            title_slug = self.begin_document(doc_title)
+
+        records = (
+            (i, chunk, embedding) for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+            if not incremental or i >= len(previous) or previous[i] != chunk_hash(chunk)
         )
+        changed = False
+        while True:
+            batch = list(islice(records, STORE_BATCH_SIZE))
+            if not batch:
+                break
+            indexes, batch_chunks, batch_embeddings = (list(column) for column in zip(*batch))
+            self.add_chunk_batch(title_slug, batch_chunks, batch_embeddings, indexes=indexes, replace=incremental)
+            changed = True
+        if incremental:
+            self.finish_document(title_slug, len(chunks), changed=changed)
         return title_slug
 
     def get_similar_chunks(self, query_embedding, doc_title=None, n_results=5):
         """
         Finds and returns the most similar chunks based on a query embedding.
         """
-        where_filter = {"doc_title": doc_title} if doc_title else {}
+        where_filter = {"doc_title": doc_title} if doc_title else self._library_filter()
         results = self.collection.query(
             query_embeddings=[query_embedding],
             n_results=n_results,
@@ -82,16 +371,225 @@ class ChromaHandler:
         )
         return results["documents"][0] if results["documents"] else []
 
+    def _is_decisive(self, lexical_hits: list) -> bool:
+        if not HYBRID_DECISIVE_RATIO or not lexical_hits:
+            return False
+        top = lexical_hits[0][1]
+        runner_up = lexical_hits[1][1] if len(lexical_hits) > 1 else 0.0
+        return top >= HYBRID_DECISIVE_MIN_SCORE and top >= HYBRID_DECISIVE_RATIO * runner_up
+
+    def hybrid_search(self, query: str, embed_fn, doc_title=None, n_results=5):
+        """
+        Retrieves chunks by fusing BM25 and vector rankings with reciprocal-rank fusion.
+
+        When the document's lexical ranking is decisive the embedding call is skipped
+        and BM25 results are returned directly. Library-wide queries, and documents
+        without a lexical index, use vector search only.
+
+        Args:
+            query (str): The user's question.
+            embed_fn: Callable returning the query embedding (or None on failure).
+            doc_title (str): Optional title slug to search within.
+            n_results (int): Number of chunks to return.
+
+        Returns:
+            list: Chunk texts, best first.
+        """
+        candidates, _ = self.hybrid_candidates(query, embed_fn, doc_title=doc_title, n_results=n_results)
+        return [candidate["document"] for candidate in candidates]
+
+    def hybrid_candidates(self, query: str, embed_fn, doc_title=None, n_results=5, include_embeddings=False):
+        """
+        Same retrieval as hybrid_search, returning (candidates, query_embedding).
+        Each candidate is a dict with "id", "document" and, if requested, "embedding".
+        query_embedding is None when the lexical ranking was decisive.
+        """
+        include = ["documents", "embeddings"] if include_embeddings else ["documents"]
+        lexical_hits = self.lexical_index.search(doc_title, query, HYBRID_CANDIDATES) if doc_title else []
+        if self._is_decisive(lexical_hits):
+            ranked_ids = [chunk_id for chunk_id, _ in lexical_hits[:n_results]]
+            return self._records_for_ids(ranked_ids, include), None
+
+        query_embedding = embed_fn(query)
+        if not query_embedding:
+            raise ValueError("Failed to generate embedding for the query.")
+        where_filter = {"doc_title": doc_title} if doc_title else self._library_filter()
+        results = self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=max(HYBRID_CANDIDATES, n_results) if lexical_hits else n_results,
+            where=where_filter,
+            include=include
+        )
+        vector_ids = results["ids"][0] if results["ids"] else []
+        records = {}
+        for i, chunk_id in enumerate(vector_ids):
+            records[chunk_id] = {"id": chunk_id, "document": results["documents"][0][i]}
+            if include_embeddings:
+                records[chunk_id]["embedding"] = results["embeddings"][0][i]
+        if not lexical_hits:
+            return [records[chunk_id] for chunk_id in vector_ids[:n_results]], query_embedding
+
+        ranked_ids = reciprocal_rank_fusion([[chunk_id for chunk_id, _ in lexical_hits], vector_ids])[:n_results]
+        missing = [chunk_id for chunk_id in ranked_ids if chunk_id not in records]
+        if missing:
+            records.update((record["id"], record) for record in self._records_for_ids(missing, include))
+        return [records[chunk_id] for chunk_id in ranked_ids if chunk_id in records], query_embedding
+
+    def batch_candidates(self, queries: list, query_embeddings: list, doc_titles=None, n_results=5,
+                         include_embeddings=False) -> list:
+        """
+        Retrieves candidates for many queries with a single multi-query vector search.
+
+        doc_titles restricts the search to those title slugs (None searches the
+        whole library). For each listed title the BM25 ranking is merged in, and
+        the combined lexical list is fused with the vector ranking.
+
+        Returns:
+            list: One candidate list (as returned by hybrid_candidates) per query.
+        """
+        include = ["documents", "embeddings"] if include_embeddings else ["documents"]
+        if not doc_titles:
+            where_filter = self._library_filter()
+        elif len(doc_titles) == 1:
+            where_filter = {"doc_title": doc_titles[0]}
+        else:
+            where_filter = {"doc_title": {"$in": list(doc_titles)}}
+        results = self.collection.query(
+            query_embeddings=list(query_embeddings),
+            n_results=max(HYBRID_CANDIDATES, n_results) if doc_titles else n_results,
+            where=where_filter,
+            include=include
+        )
+
+        records = {}
+        rankings = []
+        for q, query in enumerate(queries):
+            vector_ids = results["ids"][q] if results["ids"] else []
+            for i, chunk_id in enumerate(vector_ids):
+                records[chunk_id] = {"id": chunk_id, "document": results["documents"][q][i]}
+                if include_embeddings:
+                    records[chunk_id]["embedding"] = results["embeddings"][q][i]
+            lexical_hits = []
+            for doc_title in doc_titles or ():
+                lexical_hits.extend(self.lexical_index.search(doc_title, query, HYBRID_CANDIDATES))
+            if lexical_hits:
+                lexical_hits.sort(key=lambda hit: hit[1], reverse=True)
+                lexical_ids = [chunk_id for chunk_id, _ in lexical_hits[:HYBRID_CANDIDATES]]
+                rankings.append(reciprocal_rank_fusion([lexical_ids, vector_ids])[:n_results])
+            else:
+                rankings.append(vector_ids[:n_results])
+
+        missing = list(dict.fromkeys(chunk_id for ranking in rankings for chunk_id in ranking
+                                     if chunk_id not in records))
+        if missing:
+            records.update((record["id"], record) for record in self._records_for_ids(missing, include))
+        return [[records[chunk_id] for chunk_id in ranking if chunk_id in records] for ranking in rankings]
+
+    def _records_for_ids(self, ids: list, include: list) -> list:
+        """
+        Fetches chunk records for ids, preserving the order of ids.
+        """
+        if not ids:
+            return []
+        results = self.collection.get(ids=ids, include=include)
+        records = {}
+        for i, chunk_id in enumerate(results["ids"]):
+            records[chunk_id] = {"id": chunk_id, "document": results["documents"][i]}
+            if "embeddings" in include:
+                records[chunk_id]["embedding"] = results["embeddings"][i]
+        return [records[chunk_id] for chunk_id in ids if chunk_id in records and records[chunk_id]["document"] is not None]
+
     def get_all_titles(self):
         """
-        Retrieves all unique document titles from the collection.
+        Retrieves all unique document titles from the document catalog.
+        """
+        if self.catalog.reconciled_at() is None:
+            self.reconcile_catalog()
+        return self.catalog.titles()
+
+    def list_documents(self, offset: int = 0, limit: int = 50, query: str = None, sort: str = "title_slug",
+                       descending: bool = False) -> dict:
+        if self.catalog.reconciled_at() is None:
+            self.reconcile_catalog()
+        return self.catalog.list(offset=offset, limit=limit, query=query, sort=sort, descending=descending)
+
+    def reconcile_catalog(self):
+        """
+        Brings the catalog in line with a full scan of the collection, which
+        other processes and machines write to as well. Documents indexed
+        elsewhere are added (with their hidden flag), chunk counts are
+        corrected, and documents deleted elsewhere are dropped. The local copies
+        of changed documents (lexical index, full text) are dropped too, and
+        their listeners notified. Documents this process is writing, or wrote
+        while the scan ran, are left alone.
+        """
+        with self._reconcile_lock:
+            started = time.time()
+            counts = {}
+            hidden = set()
+            offset = 0
+            while True:
+                page = self.collection.get(include=["metadatas"], limit=CATALOG_RECONCILE_PAGE_SIZE, offset=offset)
+                metadatas = page.get("metadatas") or []
+                for metadata in metadatas:
+                    if metadata and "doc_title" in metadata:
+                        counts[metadata["doc_title"]] = counts.get(metadata["doc_title"], 0) + 1
+                        if metadata.get("hidden"):
+                            hidden.add(metadata["doc_title"])
+                if len(metadatas) < CATALOG_RECONCILE_PAGE_SIZE:
+                    break
+                offset += len(metadatas)
+
+            busy = self._busy_since(started)
+            known = self.catalog.chunk_counts()
+            added = changed = removed = 0
+            for title_slug, count in counts.items():
+                if title_slug in busy:
+                    continue
+                if title_slug not in known:
+                    self.catalog.reset_document(title_slug)
+                    self.catalog.update_document(title_slug, chunk_count=count)
+                    added += 1
+                elif known[title_slug] != count:
+                    # Re-ingested elsewhere: the local hashes, lexical index and text no longer match.
+                    self._forget_document(title_slug)
+                    self.catalog.reset_document(title_slug)
+                    self.catalog.update_document(title_slug, chunk_count=count)
+                    changed += 1
+                if title_slug in hidden:
+                    self.catalog.set_hidden(title_slug)
+            for title_slug, count in known.items():
+                # Entries without chunks are documents whose first batch has not been written yet.
+                if count and title_slug not in counts and title_slug not in busy:
+                    self._forget_document(title_slug)
+                    removed += 1
+            self.catalog.mark_reconciled(started)
+        if added or changed or removed:
+            logging.info(f"Reconciled the catalog with the collection: {added} added, {changed} changed, "
+                         f"{removed} removed.")
+
+    def start_catalog_reconciler(self, interval: float = CATALOG_RECONCILE_SECONDS):
+        """
+        Starts a daemon thread that reconciles the catalog every `interval`
+        seconds. Processes sharing the catalog file skip a scan another one just ran.
         """
-        results = self.collection.get(include=["metadatas"])
-        titles = set()
-        for metadata in results.get("metadatas", []):
-            if metadata and "doc_title" in metadata:
-                titles.add(metadata["doc_title"])
-        return list(titles)
+        if interval <= 0 or self._reconciler is not None:
+            return
+
+        def run():
+            while True:
+                due_in = (self.catalog.reconciled_at() or 0.0) + interval - time.time()
+                if due_in > 0:
+                    time.sleep(due_in)
+                    continue
+                try:
+                    self.reconcile_catalog()
+                except Exception as e:
+                    logging.error(f"Reconciling the catalog failed: {e}", exc_info=True)
+                    time.sleep(interval)
+
+        self._reconciler = threading.Thread(target=run, name="catalog-reconciler", daemon=True)
+        self._reconciler.start()
 
     def get_all_chunks_for_document(self, doc_title):
         """
@@ -105,6 +603,45 @@ class ChromaHandler:
         chunks_with_ids.sort(key=lambda x: int(x[0].split('_')[-1]))
         return [chunk for id, chunk in chunks_with_ids]
 
+    def get_document_pages(self, doc_title):
+        """
+        Returns a document's page texts in order from the full-text store.
+        Documents ingested before the store existed fall back to their chunks.
+        """
+        pages = self.document_store.get_pages(doc_title)
+        if pages is not None:
+            return pages
+        return self.get_all_chunks_for_document(doc_title)
+
+    def get_document_text(self, doc_title):
+        """
+        Returns a document's full text with a single local lookup when possible.
+        """
+        text = self.document_store.get_text(doc_title)
+        if text is not None:
+            return text
+        return "\n".join(self.get_all_chunks_for_document(doc_title))
+
+    def get_chunk_pages(self, doc_title, chunk_ids: list) -> dict:
+        """
+        Maps chunk ids to the 1-based (first_page, last_page) they were cut from.
+        """
+        indexes = {chunk_id: int(chunk_id.rsplit("_", 1)[-1]) for chunk_id in chunk_ids
+                   if chunk_id.startswith(f"{doc_title}_chunk_") and chunk_id.rsplit("_", 1)[-1].isdigit()}
+        pages = self.document_store.chunk_pages(doc_title, list(indexes.values()))
+        return {chunk_id: (pages[i][0] + 1, pages[i][1] + 1) for chunk_id, i in indexes.items() if i in pages}
+
+    def _forget_document(self, title_slug: str):
+        """
+        Drops everything this process keeps about a document besides its chunks.
+        """
+        self.lexical_index.delete(title_slug)
+        self.catalog.delete(title_slug)
+        self.document_store.delete(title_slug)
+        self._notify_invalidated(title_slug)
+
     def delete_document(self, doc_title):
-        self.collection.delete(where={"doc_title": doc_title})
+        with self.writing(doc_title):
+            self.collection.delete(where={"doc_title": doc_title})
+            self._forget_document(doc_title)
         return f"Deleted all chunks for document title: {doc_title}"
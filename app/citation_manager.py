@@ -1,4 +1,11 @@
-from app.startup import mistral_api
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from app.completion_cache import completion_cache, content_key
+from app.metrics import propagate_context
+from app.rate_limit import RateLimiter
+from app.startup import mistral_api, model
 
 def extract_references(text: str) -> list[str]:
     """
@@ -26,11 +33,10 @@ Output:
     return references
 
 
-def format_references(references: list[str], style: str = "APA") -> str:
+def format_references_prompt(references: list[str], style: str = "APA") -> str:
     """
-    Format references in the given style: APA or BibTeX.
+    Builds the prompt that formats references in the given style: APA or BibTeX.
     """
-    
     style = style.upper()
     joined_refs = "\n".join(references)
 
@@ -60,5 +66,195 @@ References:
 
 Output:
 """
+    return prompt
+
+
+def format_references(references: list[str], style: str = "APA") -> str:
+    """
+    Format references in the given style: APA or BibTeX.
+    """
+    return mistral_api(format_references_prompt(references, style)).strip()
+
+
+# --- Local reference-section locator and parser ---
+# The references section is found and split into entries without the model;
+# only those entries are sent for formatting, in parallel batches.
+
+REFERENCE_BATCH_SIZE = int(os.getenv("REFERENCE_BATCH_SIZE", "25"))
+REFERENCE_CONCURRENCY = int(os.getenv("REFERENCE_CONCURRENCY", "4"))
+REFERENCE_REQUESTS_PER_SECOND = float(os.getenv("REFERENCE_REQUESTS_PER_SECOND", "2"))
+# When no references heading is found, only this tail of the paper is sent to the model.
+REFERENCE_FALLBACK_TAIL_CHARS = int(os.getenv("REFERENCE_FALLBACK_TAIL_CHARS", "30000"))
+
+_REFERENCE_HEADING = re.compile(
+    r"^\s*(?:\d+\.?\s*|[IVX]+\.\s*)?(references|bibliography|works cited|literature cited|reference list)\s*:?\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_SECTION_END_HEADING = re.compile(
+    r"^\s*(?:appendix|appendices|supplementary material|supplemental material|acknowledg(?:e)?ments?)\b.*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_NUMBERED_ENTRY = re.compile(r"^\s*(?:\[(\d{1,3})\]|(\d{1,3})\.\s)")
+_AUTHOR_START = re.compile(r"^\s*(?:[A-Z][A-Za-z'`\-]+(?: [A-Z][A-Za-z'`\-]+)?,\s*(?:[A-Z]\.|[A-Z][a-z]+)|[A-Z]\.\s*[A-Z][A-Za-z'`\-]+,)")
+_YEAR = re.compile(r"\(?\b((?:19|20)\d{2}[a-z]?)\b\)?")
+_DOI = re.compile(r"\b(10\.\d{4,9}/[^\s\"<>]+)", re.IGNORECASE)
+_URL = re.compile(r"https?://\S+")
+
+citation_rate_limiter = RateLimiter(REFERENCE_REQUESTS_PER_SECOND)
+
+
+def locate_reference_section(text: str):
+    """
+    Returns the text of the References/Bibliography section, or None if no heading is found.
+    The last matching heading is used, since tables of contents may mention it earlier.
+    """
+    headings = list(_REFERENCE_HEADING.finditer(text))
+    if not headings:
+        return None
+    section = text[headings[-1].end():]
+    end = _SECTION_END_HEADING.search(section)
+    if end and end.start() > 0:
+        section = section[:end.start()]
+    return section.strip() or None
+
+
+def split_reference_entries(section: str) -> list[str]:
+    """
+    Splits a references section into individual entries.
+
+    Numbered entries ("[1]", "1.") are used when present. Otherwise a new entry
+    starts at an unindented line that looks like an author list, or after a line
+    ending in a period when the previous entry already has a year. Hanging-indent
+    continuation lines are folded into the current entry.
+    """
+    lines = [line.rstrip() for line in section.splitlines() if line.strip()]
+    if not lines:
+        return []
+
+    numbered = sum(1 for line in lines if _NUMBERED_ENTRY.match(line))
+    use_numbers = numbered >= max(2, len(lines) // 10)
+
+    entries = []
+    current = []
+    for line in lines:
+        if use_numbers:
+            starts_entry = bool(_NUMBERED_ENTRY.match(line))
+        else:
+            indented = line[:1].isspace()
+            previous = " ".join(current)
+            starts_entry = not indented and (
+                bool(_AUTHOR_START.match(line))
+                or (previous.endswith(".") and bool(_YEAR.search(previous)) and line[:1].isupper())
+            )
+        if starts_entry and current:
+            entries.append(" ".join(current))
+            current = []
+        current.append(line.strip())
+    if current:
+        entries.append(" ".join(current))
+
+    cleaned = []
+    seen = set()
+    for entry in entries:
+        entry = re.sub(r"-\s+(?=[a-z])", "", entry)  # re-join words hyphenated across lines
+        entry = re.sub(r"\s+", " ", entry).strip()
+        key = entry.lower()
+        if len(entry) >= 20 and key not in seen:
+            seen.add(key)
+            cleaned.append(entry)
+    return cleaned
+
+
+def parse_reference_fields(entry: str) -> dict:
+    """
+    Best-effort parse of common fields from a single reference entry.
+    """
+    body = _NUMBERED_ENTRY.sub("", entry, count=1).strip()
+    fields = {"raw": entry, "authors": None, "year": None, "title": None, "doi": None, "url": None}
+
+    doi = _DOI.search(body)
+    if doi:
+        fields["doi"] = doi.group(1).rstrip(".,;")
+    url = _URL.search(body)
+    if url:
+        fields["url"] = url.group(0).rstrip(".,;")
+
+    year = _YEAR.search(body)
+    if year:
+        fields["year"] = year.group(1)
+    if year and year.group(0).startswith("("):
+        # Author-year styles (APA, Harvard): "Authors (2019). Title. Venue."
+        authors = body[:year.start()].strip(" .,")
+        rest = body[year.end():].lstrip(" .,):")
+        title = re.split(r"(?<=[a-z0-9\?\!])\.\s", rest, maxsplit=1)[0]
+    else:
+        # Numbered styles (IEEE, ACM): "Authors. Title. Venue, year." Periods after
+        # single-letter initials do not end a segment.
+        segments = re.split(r"(?<!\b[A-Z])\.\s+", body, maxsplit=2)
+        authors = segments[0]
+        title = segments[1] if len(segments) > 1 else ""
+    authors = authors.strip(" .,")
+    title = title.strip(" .\"“”")
+    if authors:
+        fields["authors"] = authors
+    if title:
+        fields["title"] = title
+    return fields
+
+
+def _format_reference_batch(entries: list[str], style: str) -> str:
+    with citation_rate_limiter:
+        return format_references(entries, style=style)
+
+
+def get_reference_entries(text: str) -> list[str]:
+    """
+    Returns the paper's reference entries, found locally when possible.
+    """
+    section = locate_reference_section(text)
+    entries = split_reference_entries(section) if section else []
+    if entries:
+        return entries
+    # No recognisable section: let the model extract references from the end of the paper.
+    # The extraction is style independent, so it is cached separately and shared by all styles.
+    tail = text[-REFERENCE_FALLBACK_TAIL_CHARS:]
+    extract_key = content_key("references", model, tail)
+    extracted = completion_cache.get(extract_key)
+    if extracted is None:
+        extracted = "\n".join(extract_references(tail))
+        completion_cache.put(extract_key, extracted)
+    return [line for line in extracted.splitlines() if line.strip()]
+
+
+def batch_reference_entries(entries: list[str]) -> list[list[str]]:
+    return [entries[i:i + REFERENCE_BATCH_SIZE] for i in range(0, len(entries), REFERENCE_BATCH_SIZE)]
+
+
+def citations_cache_key(text: str, style: str) -> str:
+    return content_key("citations", model, style.upper(), text)
+
+
+def get_formatted_citations(text: str, style: str = "APA") -> str:
+    """
+    Finds and formats a paper's references, caching the result per document text and style.
+    """
+    style = style.upper()
+    cache_key = citations_cache_key(text, style)
+    cached = completion_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    entries = get_reference_entries(text)
+    if not entries:
+        return ""
+
+    batches = batch_reference_entries(entries)
+    if len(batches) == 1:
+        formatted = [_format_reference_batch(batches[0], style)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(REFERENCE_CONCURRENCY, len(batches))) as executor:
+            formatted = list(executor.map(propagate_context(lambda batch: _format_reference_batch(batch, style)), batches))
 
-    return mistral_api(prompt).strip()
+    result = "\n\n".join(part for part in formatted if part)
+    completion_cache.put(cache_key, result)
+    return result
@@ -0,0 +1,97 @@
+# clients.py
+
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Every outbound client is created on first use and shared process-wide, so
+# importing the app never touches the network. The Mistral SDK's sync and
+# async HTTP clients are pooled and kept alive across chat and embedding calls.
+MISTRAL_MAX_CONNECTIONS = int(os.getenv("MISTRAL_MAX_CONNECTIONS", "20"))
+MISTRAL_MAX_KEEPALIVE = int(os.getenv("MISTRAL_MAX_KEEPALIVE", "10"))
+MISTRAL_TIMEOUT = float(os.getenv("MISTRAL_TIMEOUT", "120"))
+# Overrides the Mistral API base URL, e.g. for a proxy or the offline benchmark server.
+MISTRAL_SERVER_URL = os.getenv("MISTRAL_SERVER_URL") or None
+# Create the clients and connect to the vector store at startup instead of on the first request.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_mistral_client = None
+_collection = None
+
+
+def get_mistral_client():
+    """
+    Returns the shared Mistral client, creating it and its connection pools on first use.
+    """
+    global _mistral_client
+    if _mistral_client is None:
+        with _lock:
+            if _mistral_client is None:
+                api_key = os.getenv("MISTRAL_API_KEY")
+                if not api_key:
+                    raise ValueError("MISTRAL_API_KEY environment variable must be set.")
+                import httpx
+                from mistralai import Mistral
+
+                limits = httpx.Limits(max_connections=MISTRAL_MAX_CONNECTIONS,
+                                      max_keepalive_connections=MISTRAL_MAX_KEEPALIVE)
+                _mistral_client = Mistral(
+                    api_key=api_key,
+                    server_url=MISTRAL_SERVER_URL,
+                    client=httpx.Client(limits=limits, timeout=MISTRAL_TIMEOUT, follow_redirects=True),
+                    async_client=httpx.AsyncClient(limits=limits, timeout=MISTRAL_TIMEOUT, follow_redirects=True),
+                )
+    return _mistral_client
+
+
+def get_collection():
+    """
+    Returns the shared vector store collection, connecting on first use.
+    A failed connection is retried on the next call rather than cached.
+    """
+    global _collection
+    if _collection is None:
+        with _lock:
+            if _collection is None:
+                from app.chroma_handler import create_collection
+
+                _collection = create_collection()
+    return _collection
+
+
+def readiness() -> dict:
+    """
+    Checks that the Mistral client can be created and the vector store answers.
+    """
+    checks = {}
+    try:
+        get_mistral_client()
+        checks["mistral"] = "ok"
+    except Exception as e:
+        checks["mistral"] = f"error: {e}"
+    try:
+        get_collection().count()
+        checks["vector_store"] = "ok"
+    except Exception as e:
+        checks["vector_store"] = f"error: {e}"
+    return {"ready": all(status == "ok" for status in checks.values()), "checks": checks}
+
+
+def warm_up():
+    """
+    Eagerly creates the shared clients; failures are logged and retried lazily later.
+    """
+    started = time.perf_counter()
+    status = readiness()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if status["ready"]:
+        logging.info(f"Warm-up finished in {elapsed_ms:.0f} ms.")
+    else:
+        logging.warning(f"Warm-up incomplete after {elapsed_ms:.0f} ms: {status['checks']}")
+    return status
@@ -0,0 +1,68 @@
+# completion_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Persistent cache for LLM outputs that are a pure function of their input
+# (partial summaries, extracted references, ...), keyed by content hash.
+COMPLETION_CACHE_PATH = os.getenv("COMPLETION_CACHE_PATH", os.path.join(".cache", "completions.sqlite3"))
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "20000"))
+
+
+def content_key(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class CompletionCache:
+    """
+    Size-bounded SQLite key/value store for generated text, evicting least recently used entries.
+    """
+
+    def __init__(self, path: str = COMPLETION_CACHE_PATH, max_entries: int = COMPLETION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)")
+        self._db.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO completions (key, value, last_used) VALUES (?, ?, ?)",
+                             (key, value, time.time()))
+            (count,) = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM completions WHERE key IN (SELECT key FROM completions ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+completion_cache = CompletionCache()
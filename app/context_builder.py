@@ -0,0 +1,137 @@
+# context_builder.py
+
+import os
+import re
+
+import numpy as np
+
+from app.embedding_engine import estimate_tokens
+from app.lexical_index import tokenize
+
+# Retrieved chunks are turned into prompt context in three steps: candidates
+# are re-ranked with maximal marginal relevance (near-duplicates dropped),
+# the picks are added until CONTEXT_TOKEN_BUDGET is reached, and chunks that
+# are adjacent in their document are merged with the shared overlap removed.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "12"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.92"))
+PASSAGE_SEPARATOR = "\n\n"
+
+_CHUNK_ID = re.compile(r"^(?P<slug>.+)_chunk_(?P<index>\d+)$")
+
+
+def chunk_position(chunk_id: str):
+    """
+    Returns (title_slug, chunk_index) for a chunk id, or None if it is not a chunk id.
+    """
+    match = _CHUNK_ID.match(chunk_id or "")
+    return (match["slug"], int(match["index"])) if match else None
+
+
+def merge_overlapping(first: str, second: str, min_overlap: int = 20) -> str:
+    """
+    Joins two consecutive chunks, dropping the longest suffix of first that
+    starts second. Chunks that do not overlap are joined with a space.
+    """
+    probe = second[:min_overlap]
+    if len(probe) == min_overlap:
+        position = first.find(probe)
+        while position >= 0:
+            tail = first[position:]
+            if second.startswith(tail):
+                return first + second[len(tail):]
+            position = first.find(probe, position + 1)
+    return f"{first} {second}"
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+
+def _similarities(candidates: list, query_embedding):
+    """
+    Returns (relevance per candidate, pairwise similarity matrix). Embedding
+    cosine is used when every candidate has one; otherwise relevance follows the
+    retrieval rank and redundancy is token-set (Jaccard) overlap.
+    """
+    n = len(candidates)
+    embeddings = [candidate.get("embedding") for candidate in candidates]
+    if all(embedding is not None for embedding in embeddings):
+        matrix = _normalise(np.asarray(embeddings, dtype=np.float32))
+        pairwise = matrix @ matrix.T
+        if query_embedding is not None:
+            relevance = matrix @ _normalise(np.asarray(query_embedding, dtype=np.float32))
+            return relevance, pairwise
+    else:
+        token_sets = [set(tokenize(candidate["document"])) for candidate in candidates]
+        pairwise = np.zeros((n, n), dtype=np.float32)
+        for i in range(n):
+            for j in range(i + 1, n):
+                union = len(token_sets[i] | token_sets[j])
+                pairwise[i, j] = pairwise[j, i] = len(token_sets[i] & token_sets[j]) / union if union else 0.0
+    relevance = np.linspace(1.0, 0.5, n) if n > 1 else np.ones(1)
+    return relevance, pairwise
+
+
+def mmr_order(candidates: list, query_embedding=None, mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+              duplicate_similarity: float = CONTEXT_DUPLICATE_SIMILARITY) -> list:
+    """
+    Orders candidates by maximal marginal relevance, dropping any whose
+    similarity to an already selected candidate reaches duplicate_similarity.
+    """
+    if len(candidates) < 2:
+        return list(candidates)
+    relevance, pairwise = _similarities(candidates, query_embedding)
+    remaining = list(range(len(candidates)))
+    selected = []
+    while remaining:
+        if selected:
+            redundancy = pairwise[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(scores))
+        pick = remaining.pop(best)
+        if redundancy[best] >= duplicate_similarity:
+            continue
+        selected.append(pick)
+    return [candidates[i] for i in selected]
+
+
+def build_context(candidates: list, query_embedding=None, token_budget: int = CONTEXT_TOKEN_BUDGET) -> list:
+    """
+    Turns retrieved chunk candidates (dicts with "id", "document" and optionally
+    "embedding", best first) into prompt passages that fit token_budget.
+
+    Passages are returned in document order; runs of adjacent chunks from the
+    same document become a single passage without the repeated overlap.
+    """
+    picked = []
+    used = 0
+    for candidate in mmr_order(candidates, query_embedding):
+        cost = estimate_tokens(candidate["document"])
+        if used + cost > token_budget:
+            if picked:
+                continue
+            # The best chunk alone exceeds the budget: keep a truncated copy of it.
+            candidate = {**candidate, "document": candidate["document"][:token_budget * 4]}
+            cost = token_budget
+        picked.append(candidate)
+        used += cost
+
+    positioned = []
+    for rank, candidate in enumerate(picked):
+        position = chunk_position(candidate.get("id"))
+        positioned.append((position or (None, rank), candidate["document"]))
+    positioned.sort(key=lambda item: (str(item[0][0]), item[0][1]))
+
+    passages = []
+    previous = None
+    for (slug, index), text in positioned:
+        if previous is not None and slug is not None and previous == (slug, index - 1):
+            passages[-1] = merge_overlapping(passages[-1], text)
+        else:
+            passages.append(text)
+        previous = (slug, index) if slug is not None else None
+    return passages
@@ -0,0 +1,198 @@
+# document_store.py
+
+import json
+import os
+import re
+import tempfile
+import threading
+import zlib
+from bisect import bisect_right
+
+# Ordered full text of every ingested document, written once at ingest time.
+# Each document is its pages joined with single spaces (the same text the
+# chunker sees), compressed as independent zlib blocks of
+# DOCUMENT_STORE_BLOCK_PAGES pages, plus a JSON index of page start offsets,
+# block byte offsets and the [start, end) character span of every chunk, so a
+# page range only decompresses the blocks it falls in.
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", os.path.join(".cache", "documents"))
+DOCUMENT_STORE_BLOCK_PAGES = int(os.getenv("DOCUMENT_STORE_BLOCK_PAGES", "8"))
+PAGE_SEPARATOR = " "
+
+
+class DocumentStoreWriter:
+    """
+    Streams a document's pages to a temporary compressed file and records chunk spans.
+    No page text is kept in memory.
+    """
+
+    def __init__(self, directory: str, block_pages: int = DOCUMENT_STORE_BLOCK_PAGES):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._compressor = zlib.compressobj(6)
+        self.block_pages = max(1, block_pages)
+        self.block_offsets = [0]
+        self.page_offsets = []
+        self.chunk_spans = []
+        self.length = 0
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._written += len(data)
+
+    def add_pages(self, texts: list):
+        with self._lock:
+            for text in texts:
+                if self.page_offsets and len(self.page_offsets) % self.block_pages == 0:
+                    # Close the block so it can be decompressed on its own.
+                    self._write(self._compressor.flush())
+                    self.block_offsets.append(self._written)
+                    self._compressor = zlib.compressobj(6)
+                if self.page_offsets:
+                    text = PAGE_SEPARATOR + text
+                    self.page_offsets.append(self.length + len(PAGE_SEPARATOR))
+                else:
+                    self.page_offsets.append(0)
+                self._write(self._compressor.compress(text.encode("utf-8")))
+                self.length += len(text)
+
+    def add_span(self, start: int, end: int):
+        """
+        Records the [start, end) span of the next chunk in the joined page text.
+        """
+        with self._lock:
+            self.chunk_spans.append([start, min(end, self.length)])
+
+    def close(self):
+        self._write(self._compressor.flush())
+        self.block_offsets.append(self._written)
+        self._file.close()
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DocumentStore:
+    """
+    Compressed per-document full-text store with page and chunk offsets.
+    """
+
+    def __init__(self, directory: str = DOCUMENT_STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, title_slug: str):
+        safe = re.sub(r"[^\w\-]", "_", title_slug)
+        base = os.path.join(self.directory, safe)
+        return base + ".text.z", base + ".index.json"
+
+    def writer(self) -> DocumentStoreWriter:
+        return DocumentStoreWriter(self.directory)
+
+    def commit(self, writer: DocumentStoreWriter, title_slug: str):
+        """
+        Publishes a finished writer's output under the document's slug.
+        """
+        writer.close()
+        text_path, index_path = self._paths(title_slug)
+        index = {"length": writer.length, "page_offsets": writer.page_offsets, "chunk_spans": writer.chunk_spans,
+                 "block_pages": writer.block_pages, "block_offsets": writer.block_offsets}
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(writer.path, text_path)
+        os.replace(index_path + ".tmp", index_path)
+
+    def delete(self, title_slug: str):
+        for path in self._paths(title_slug):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def has_document(self, title_slug: str) -> bool:
+        return all(os.path.exists(path) for path in self._paths(title_slug))
+
+    def _index(self, title_slug: str):
+        _, index_path = self._paths(title_slug)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            return json.load(f)
+
+    def _read_blocks(self, title_slug: str, index: dict, first_page: int, last_page: int):
+        """
+        Decompresses only the blocks holding pages [first_page, last_page]. Returns
+        (text, character offset of the text in the document), or None.
+        """
+        text_path, _ = self._paths(title_slug)
+        if not os.path.exists(text_path):
+            return None
+        block_pages = index.get("block_pages")
+        block_offsets = index.get("block_offsets")
+        if not block_pages or not block_offsets:
+            # Written as a single stream before documents were split into blocks.
+            with open(text_path, "rb") as f:
+                return zlib.decompress(f.read()).decode("utf-8"), 0
+        first_block, last_block = first_page // block_pages, last_page // block_pages
+        with open(text_path, "rb") as f:
+            f.seek(block_offsets[first_block])
+            data = f.read(block_offsets[last_block + 1] - block_offsets[first_block])
+        blocks = []
+        for block in range(first_block, last_block + 1):
+            start = block_offsets[block] - block_offsets[first_block]
+            blocks.append(zlib.decompress(data[start:start + block_offsets[block + 1] - block_offsets[block]]))
+        # Every block but the first starts with the separator before its first page.
+        first_offset = index["page_offsets"][first_block * block_pages] if index["page_offsets"] else 0
+        if first_block:
+            first_offset -= len(PAGE_SEPARATOR)
+        return b"".join(blocks).decode("utf-8"), first_offset
+
+    def get_text(self, title_slug: str):
+        """
+        Returns the document's full text, or None if it is not in the store.
+        """
+        index = self._index(title_slug)
+        if index is None:
+            return None
+        read = self._read_blocks(title_slug, index, 0, max(len(index["page_offsets"]) - 1, 0))
+        return read[0] if read else None
+
+    def get_pages(self, title_slug: str, first_page: int = 0, last_page: int = None):
+        """
+        Returns the text of pages [first_page, last_page] (0-based, inclusive), or None.
+        """
+        index = self._index(title_slug)
+        if index is None:
+            return None
+        offsets = index["page_offsets"]
+        first_page = max(first_page, 0)
+        last_page = len(offsets) - 1 if last_page is None else min(last_page, len(offsets) - 1)
+        if first_page > last_page:
+            return [] if self.has_document(title_slug) else None
+        read = self._read_blocks(title_slug, index, first_page, last_page)
+        if read is None:
+            return None
+        text, base = read
+        pages = []
+        for page in range(first_page, last_page + 1):
+            end = offsets[page + 1] - len(PAGE_SEPARATOR) if page + 1 < len(offsets) else index["length"]
+            pages.append(text[offsets[page] - base:end - base])
+        return pages
+
+    def chunk_pages(self, title_slug: str, chunk_indexes: list) -> dict:
+        """
+        Maps chunk indexes to the (first_page, last_page) range they span, 0-based.
+        """
+        index = self._index(title_slug)
+        if index is None:
+            return {}
+        offsets = index["page_offsets"]
+        spans = index["chunk_spans"]
+        pages = {}
+        for chunk_index in chunk_indexes:
+            if 0 <= chunk_index < len(spans):
+                start, end = spans[chunk_index]
+                pages[chunk_index] = (bisect_right(offsets, start) - 1, bisect_right(offsets, max(start, end - 1)) - 1)
+        return pages
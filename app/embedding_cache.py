@@ -0,0 +1,160 @@
+# embedding_cache.py
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# On-disk cache location and bounds. Vectors live in a memory-mapped .npy
+# matrix (one row per slot) and a small SQLite table maps content hashes to
+# rows and tracks recency for LRU eviction.
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", os.path.join(".cache", "embeddings"))
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "100000"))
+EMBED_CACHE_DTYPE = os.getenv("EMBED_CACHE_DTYPE", "float16")
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def cache_key(model: str, text: str) -> str:
+    """
+    Content address for an embedding: sha256 of the model name and the text.
+    """
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, size-bounded LRU cache of embeddings keyed by content hash.
+    """
+
+    def __init__(self, directory: str = EMBED_CACHE_DIR, max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+                 dtype: str = EMBED_CACHE_DTYPE):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._matrix = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._matrix_path = os.path.join(directory, "vectors.npy")
+        # Several processes may share the cache; writers wait for each other's transactions.
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False, timeout=30)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.commit()
+
+        if os.path.exists(self._matrix_path):
+            self._matrix = np.load(self._matrix_path, mmap_mode="r+")
+            if self._matrix.shape[0] != max_entries or self._matrix.dtype != self.dtype:
+                logging.warning("Embedding cache layout changed; clearing existing cache.")
+                self._reset()
+
+    def _reset(self):
+        self._matrix = None
+        if os.path.exists(self._matrix_path):
+            os.remove(self._matrix_path)
+        self._db.execute("DELETE FROM entries")
+        self._db.commit()
+
+    def _ensure_matrix(self, dim: int):
+        if self._matrix is None and os.path.exists(self._matrix_path):
+            # Created by another process since this one started.
+            self._matrix = np.load(self._matrix_path, mmap_mode="r+")
+        if self._matrix is None:
+            self._matrix = np.lib.format.open_memmap(
+                self._matrix_path, mode="w+", dtype=self.dtype, shape=(self.max_entries, dim)
+            )
+        elif self._matrix.shape[1] != dim:
+            logging.warning(f"Embedding dimension changed to {dim}; clearing existing cache.")
+            self._reset()
+            self._ensure_matrix(dim)
+
+    def _allocate_slot(self) -> int:
+        """
+        Picks the row for a new entry. Must run inside the BEGIN IMMEDIATE
+        transaction of put_many, so no other writer can pick the same row.
+        """
+        (count,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        if count < self.max_entries:
+            # Rows are only ever freed by eviction (which reuses them) or a full reset,
+            # so occupied slots are always 0..count-1.
+            return count
+        # Evict the least recently used entry and reuse its row.
+        key, slot = self._db.execute("SELECT key, slot FROM entries ORDER BY last_used LIMIT 1").fetchone()
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        return slot
+
+    def get_many(self, keys: list) -> list:
+        """
+        Looks up keys and returns a vector (list of floats) or None for each one.
+        """
+        if not keys:
+            return []
+        with self._lock:
+            found = {}
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                found.update(self._db.execute(
+                    f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", part
+                ).fetchall())
+            results = []
+            for key in keys:
+                slot = found.get(key)
+                if slot is None or self._matrix is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(self._matrix[slot].astype(np.float32).tolist())
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                     [(now, key) for key in found])
+                self._db.commit()
+            return results
+
+    def put_many(self, keys: list, vectors: list):
+        """
+        Stores vectors under their keys, evicting least recently used entries when full.
+        """
+        if not keys:
+            return
+        with self._lock:
+            self._ensure_matrix(len(vectors[0]))
+            now = time.time()
+            # Slots are allocated and written under the database write lock, so
+            # concurrent writers (also in other processes) never share a row.
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for key, vector in zip(keys, vectors):
+                    row = self._db.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+                    slot = row[0] if row else self._allocate_slot()
+                    self._matrix[slot] = np.asarray(vector, dtype=self.dtype)
+                    self._db.execute("INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                                     (key, slot, now))
+                self._matrix.flush()
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            (size,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "dtype": self.dtype.name,
+        }
@@ -0,0 +1,171 @@
+# embedding_engine.py
+
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Batching and concurrency limits for the Mistral embeddings endpoint.
+# mistral-embed accepts a list of inputs per request, so we pack as many
+# chunks as fit under both the item and the (approximate) token bound.
+EMBED_MODEL = os.getenv("EMBED_MODEL", "mistral-embed")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "12000"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_BACKOFF = float(os.getenv("EMBED_RETRY_BACKOFF", "1.0"))
+
+
+class EmbeddingError(RuntimeError):
+    """Raised when a batch of chunks could not be embedded after all retries."""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token) used for batch packing.
+    """
+    return len(text) // 4 + 1
+
+
+def pack_batches(texts: list, batch_size: int = EMBED_BATCH_SIZE,
+                 max_batch_tokens: int = EMBED_MAX_BATCH_TOKENS) -> list:
+    """
+    Packs texts into contiguous batches bounded by item count and estimated tokens.
+
+    Returns:
+        list: (start_index, end_index) pairs covering texts in order.
+    """
+    batches = []
+    start = 0
+    tokens = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (i - start >= batch_size or tokens + cost > max_batch_tokens):
+            batches.append((start, i))
+            start = i
+            tokens = 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def iter_packed_batches(texts, batch_size: int = EMBED_BATCH_SIZE,
+                        max_batch_tokens: int = EMBED_MAX_BATCH_TOKENS):
+    """
+    Like pack_batches, for an iterable of unknown length: yields lists of
+    consecutive texts bounded by item count and estimated tokens.
+    """
+    batch = []
+    tokens = 0
+    for text in texts:
+        cost = estimate_tokens(text)
+        if batch and (len(batch) >= batch_size or tokens + cost > max_batch_tokens):
+            yield batch
+            batch = []
+            tokens = 0
+        batch.append(text)
+        tokens += cost
+    if batch:
+        yield batch
+
+
+class EmbeddingEngine:
+    """
+    Embeds lists of chunks with batched, concurrent calls to the Mistral API.
+    Results are always returned in input order; only failed batches are retried.
+    The client may be passed as a zero-argument factory, resolved on the first call.
+    """
+
+    def __init__(self, client, model: str = EMBED_MODEL, batch_size: int = EMBED_BATCH_SIZE,
+                 max_batch_tokens: int = EMBED_MAX_BATCH_TOKENS, concurrency: int = EMBED_CONCURRENCY,
+                 max_retries: int = EMBED_MAX_RETRIES, retry_backoff: float = EMBED_RETRY_BACKOFF):
+        self.client = client
+        self.model = model
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def _embed_batch(self, texts: list) -> list:
+        client = self.client() if callable(self.client) else self.client
+        response = client.embeddings.create(model=self.model, inputs=texts)
+        # The API reports an index per item; sort on it so ordering never depends on the server.
+        data = sorted(response.data, key=lambda d: d.index if d.index is not None else 0)
+        if len(data) != len(texts):
+            raise EmbeddingError(f"Expected {len(texts)} embeddings, got {len(data)}.")
+        return [d.embedding for d in data]
+
+    def _embed_batch_with_retry(self, texts: list) -> list:
+        attempt = 0
+        while True:
+            try:
+                return self._embed_batch(texts)
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise EmbeddingError(f"Embedding batch of {len(texts)} chunks failed: {e}") from e
+                delay = self.retry_backoff * (2 ** (attempt - 1))
+                logging.warning(f"Embedding batch failed (attempt {attempt}/{self.max_retries}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def embed_iter(self, texts: list):
+        """
+        Yields (start_index, embeddings) for each batch as soon as it completes.
+        Batches may complete out of order; start_index locates them in texts.
+        """
+        batches = pack_batches(texts, self.batch_size, self.max_batch_tokens)
+        if not batches:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+            futures = {
+                executor.submit(self._embed_batch_with_retry, texts[start:end]): start
+                for start, end in batches
+            }
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def _timed_batch(self, texts: list):
+        started = time.perf_counter()
+        return self._embed_batch_with_retry(texts), time.perf_counter() - started
+
+    def embed_stream(self, texts):
+        """
+        Embeds an iterable of texts of unknown length, such as chunks still being
+        parsed. Texts are packed into batches as they arrive and up to
+        `concurrency` batches are in flight at once. Yields (batch_texts,
+        embeddings, seconds) for each batch in input order, where seconds is how
+        long its API call took.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            in_flight = deque()
+            try:
+                for batch in iter_packed_batches(texts, self.batch_size, self.max_batch_tokens):
+                    in_flight.append((batch, executor.submit(self._timed_batch, batch)))
+                    if len(in_flight) > self.concurrency:
+                        batch, future = in_flight.popleft()
+                        yield (batch, *future.result())
+                while in_flight:
+                    batch, future = in_flight.popleft()
+                    yield (batch, *future.result())
+            finally:
+                for _, future in in_flight:
+                    future.cancel()
+
+    def embed(self, texts: list) -> list:
+        """
+        Embeds all texts and returns their vectors in input order.
+
+        Raises:
+            EmbeddingError: If any batch still fails after retries.
+        """
+        results = [None] * len(texts)
+        for start, vectors in self.embed_iter(texts):
+            results[start:start + len(vectors)] = vectors
+        return results
@@ -1,6 +1,6 @@
-from mistralai import Mistral
 import logging
-from app.startup import client  # Assuming client is initialized in startup.py
+from app.clients import get_mistral_client
+from app.metrics import span, truncate_payload, usage_tokens
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -12,34 +12,44 @@ def _call_mistral_chat_api(messages: list[dict]) -> str:
     """
     Helper function to call the Mistral AI chat completion API.
     """
-    if not client:
-        return "Error: Mistral AI client not initialized. MISTRAL_API_KEY might be missing."
-
     try:
-        logging.info(f"Calling Mistral AI with messages: {messages}")
-        chat_response = client.chat.complete(
-            model=MODEL_NAME,
-            messages=messages,
-            temperature=0.0 # Keep temperature low for factual extraction
-        )
+        client = get_mistral_client()
+        # Payloads are truncated in the log; prompts and responses can be very large.
+        logging.info(f"Calling Mistral AI with {len(messages)} messages: {truncate_payload(messages)}")
+        with span("generate") as generate:
+            chat_response = client.chat.complete(
+                model=MODEL_NAME,
+                messages=messages,
+                temperature=0.0 # Keep temperature low for factual extraction
+            )
+            generate.tokens = usage_tokens(chat_response)
         content = chat_response.choices[0].message.content
-        logging.info(f"Mistral AI response: {content}")
+        logging.info(f"Mistral AI response: {truncate_payload(content)}")
         return content
     except Exception as e:
         logging.error(f"Error calling Mistral AI API: {e}")
         return f"An error occurred while communicating with Mistral AI: {e}"
 
-def extract_initial_summary_from_url(url: str) -> str:
+async def _stream_mistral_chat_api(messages: list[dict]):
     """
-    Extracts an initial summary or key information from a document at a given URL
-    using Mistral AI's Document QnA capability.
+    Streaming variant of _call_mistral_chat_api: yields text deltas as they arrive.
+    Closing the generator closes the upstream stream.
     """
-    if not url:
-        return "Error: URL cannot be empty."
-
-    logging.info(f"Attempting to extract initial summary from URL: {url}")
+    with span("generate") as generate:
+        response = await get_mistral_client().chat.stream_async(
+            model=MODEL_NAME,
+            messages=messages,
+            temperature=0.0
+        )
+        async with response as events:
+            async for event in events:
+                generate.tokens = usage_tokens(event.data) or generate.tokens
+                delta = event.data.choices[0].delta.content if event.data.choices else None
+                if delta:
+                    yield delta
 
-    messages = [
+def _summary_messages(url: str) -> list[dict]:
+    return [
         {
             "role": "user",
             "content": [
@@ -48,7 +58,35 @@ def extract_initial_summary_from_url(url: str) -> str:
             ]
         }
     ]
-    return _call_mistral_chat_api(messages)
+
+def _question_messages(url: str, question: str) -> list[dict]:
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": question},
+                {"type": "document_url", "document_url": url}
+            ]
+        }
+    ]
+
+def stream_initial_summary_from_url(url: str):
+    return _stream_mistral_chat_api(_summary_messages(url))
+
+def stream_question_from_url(url: str, question: str):
+    return _stream_mistral_chat_api(_question_messages(url, question))
+
+def extract_initial_summary_from_url(url: str) -> str:
+    """
+    Extracts an initial summary or key information from a document at a given URL
+    using Mistral AI's Document QnA capability.
+    """
+    if not url:
+        return "Error: URL cannot be empty."
+
+    logging.info(f"Attempting to extract initial summary from URL: {url}")
+
+    return _call_mistral_chat_api(_summary_messages(url))
 
 def ask_question_from_url(url: str, question: str) -> str:
     """
@@ -60,14 +98,5 @@ def ask_question_from_url(url: str, question: str) -> str:
 
     logging.info(f"Asking question '{question}' about URL: {url}")
 
-    messages = [
-        {
-            "role": "user",
-            "content": [
-                {"type": "text", "text": question},
-                {"type": "document_url", "document_url": url}
-            ]
-        }
-    ]
-    return _call_mistral_chat_api(messages)
+    return _call_mistral_chat_api(_question_messages(url, question))
 
@@ -1,12 +1,165 @@
 # extractor.py
 
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import os
+import re
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
+
+# Chunk budget and overlap, counted in characters or, with CHUNK_UNIT=tokens,
+# in estimated tokens (CHARS_PER_TOKEN characters each, the same estimate the
+# embedding batcher uses).
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars").lower()
+CHARS_PER_TOKEN = 4
+
+# Pages are joined with this separator, so chunk offsets index " ".join(pages).
+PAGE_SEPARATOR = " "
+
+# A chunk is cut before a section heading once it holds this fraction of the
+# budget; otherwise it breaks at the best boundary past half the budget.
+MIN_SECTION_CHUNK = 0.25
+MIN_SOFT_CHUNK = 0.5
+# Extra text buffered past the budget before a chunk is cut.
+LOOKAHEAD = 200
+
+# Section headings on a line of their own: numbered ("2.1 Methods",
+# "IV. Results") or one of the usual paper section names. Headings start with
+# a digit or a capital, which lets most prose lines fail on their first character.
+_HEADING = re.compile(
+    r"\n[ \t]*(?=[\dA-Z])(?:"
+    r"(?:\d{1,2}(?:\.\d{1,2}){0,3}\.?|[IVX]{1,5}\.)[ \t]+[A-Z][^\n.!?]{1,78}"
+    r"|(?:\d{1,2}\.?[ \t]+)?(?i:abstract|introduction|background|related work|methods?|methodology|experiments?"
+    r"|results|evaluation|discussion|conclusions?|references|bibliography|acknowledge?ments?|appendix(?:[ \t]+\w)?"
+    r"|section[ \t]+\d+)(?:[ \t]+(?:and|&)[ \t]+[A-Za-z][A-Za-z ]{1,30})?:?"
+    r")[ \t]*(?=\n)"
+)
+# Soft boundaries, best first; page boundaries rank with paragraph breaks.
+_SEPARATORS = ("\n\n", "\n", ". ", "? ", "! ", "; ", " ")
+
+
+class Chunk(NamedTuple):
+    """
+    A chunk of a document: its text, the [start, end) character span of that
+    text in the joined page text, and the 0-based pages it spans.
+    """
+    text: str
+    start: int
+    end: int
+    first_page: int
+    last_page: int
+
+
+def budget_chars(size: int, unit: str = CHUNK_UNIT) -> int:
+    return size * CHARS_PER_TOKEN if unit == "tokens" else size
+
+
+def iter_chunk_records(pages, chunk_size: int = None, chunk_overlap: int = None, unit: str = CHUNK_UNIT,
+                       first_page: int = 0):
+    """
+    Streams chunks straight from page texts (e.g. parse_pdf_pages_generator).
+
+    Chunks end before section headings and otherwise at the best boundary
+    within the budget: a page break or paragraph, then a line, sentence or word.
+    Consecutive chunks overlap by about chunk_overlap, except across a heading.
+    Only the text later chunks can still reach is buffered, and each chunk's
+    text is sliced once from that buffer.
+
+    Args:
+        pages: Iterable of page texts.
+        chunk_size (int): Budget per chunk (default CHUNK_SIZE), in `unit`.
+        chunk_overlap (int): Overlap between chunks (default CHUNK_OVERLAP), in `unit`.
+        unit (str): "chars" or "tokens".
+        first_page (int): Page number of the first page, for the page metadata.
+
+    Yields:
+        Chunk: Text with its character span in " ".join(pages) and its page range.
+    """
+    size = budget_chars(CHUNK_SIZE if chunk_size is None else chunk_size, unit)
+    overlap = min(budget_chars(CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap, unit), size // 2)
+    section_min = max(int(size * MIN_SECTION_CHUNK), 1)
+    soft_min = int(size * MIN_SOFT_CHUNK)
+
+    window = ""       # joined text from offset `base` on
+    base = 0
+    length = 0        # joined text seen so far
+    start = 0         # where the next chunk starts
+    page_starts = []  # offsets of the pages and section headings seen so far
+    headings = []
+    pages = iter(pages)
+    exhausted = False
+
+    while True:
+        while not exhausted and length - start <= size + LOOKAHEAD:
+            page = next(pages, None)
+            if page is None:
+                exhausted = True
+                break
+            separator = PAGE_SEPARATOR if page_starts else ""
+            page_starts.append(length + len(separator))
+            # The pattern starts at a newline, a literal prefix the regex engine scans for quickly.
+            headings.extend(length + len(separator) + match.start() for match in _HEADING.finditer(f"\n{page}\n"))
+            window = window[start - base:] + separator + page
+            base = start
+            length += len(separator) + len(page)
+
+        while start < length and window[start - base].isspace():
+            start += 1
+        if start >= length:
+            return
+
+        limit = start + size
+        if exhausted and length <= limit:
+            end = next_start = length
+        else:
+            limit = min(limit, length)
+            position = bisect_left(headings, start + section_min)
+            if position < len(headings) and headings[position] <= limit:
+                end = next_start = headings[position]
+            else:
+                soft = start + soft_min - base
+                page_start = page_starts[bisect_right(page_starts, limit) - 1] - base
+                best = page_start if page_start > soft else -1
+                for separator in _SEPARATORS:
+                    position = window.rfind(separator, soft, limit - base)
+                    if position >= 0:
+                        best = max(best, position + len(separator.rstrip()))
+                    if best >= 0:
+                        break
+                end = next_start = base + best if best > 0 else limit
+                if overlap:
+                    # Continue at a line, sentence or word boundary, and never reach back over a heading.
+                    overlap_start = max(end - overlap, start + 1) - base
+                    for separator in ("\n", ". ", " "):
+                        position = window.find(separator, overlap_start, end - base)
+                        if position >= 0:
+                            next_start = base + position + len(separator)
+                            break
+                    position = bisect_left(headings, next_start)
+                    if position < len(headings) and headings[position] < end:
+                        next_start = headings[position]
+
+        text_end = end
+        while text_end > start and window[text_end - 1 - base].isspace():
+            text_end -= 1
+        if text_end > start:
+            yield Chunk(window[start - base:text_end - base], start, text_end,
+                        first_page + bisect_right(page_starts, start) - 1,
+                        first_page + bisect_right(page_starts, text_end - 1) - 1)
+        start = max(next_start, start + 1)
+
+
+def iter_chunks(text_generator):
+    """
+    Lazily chunks text segments (pages), yielding only the chunk texts.
+    """
+    for chunk in iter_chunk_records(text_generator):
+        yield chunk.text
 
 
 def extract_and_chunk_text(text_generator):
     """
-    Chunks text from a generator using LangChain's RecursiveCharacterTextSplitter.
+    Chunks text from a generator of segments (pages).
 
     Args:
         text_generator: An iterable (like a generator) of text segments.
@@ -14,16 +167,4 @@ def extract_and_chunk_text(text_generator):
     Returns:
         list: A list of text chunks.
     """
-    full_text = " ".join(text_generator)
-
-    # Use a recursive text splitter which is good for general text.
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-        is_separator_regex=False,
-    )
-    chunks = text_splitter.create_documents([full_text])
-    chunk_texts = [chunk.page_content for chunk in chunks]
-    return chunk_texts
-
+    return list(iter_chunks(text_generator))
@@ -0,0 +1,278 @@
+# ingest.py
+
+import contextvars
+import hashlib
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from collections import deque
+
+from app.catalog import chunk_hash
+from app.parse_pool import iter_document_chunks
+from app.pdf_parser import get_page_count
+from app.rag_qa import iter_mistral_embeddings
+
+# Chunks per store batch and how many batches may wait between stages.
+# Embedding batches are packed by the embedding engine independently of this.
+# Peak memory is bounded by roughly INGEST_BATCH_SIZE * (INGEST_QUEUE_SIZE + 2)
+# chunks plus EMBED_CONCURRENCY embedding batches, regardless of document size.
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "2"))
+# How many documents from one /upload_multiple/ request are ingested at once.
+INGEST_PARALLEL_DOCUMENTS = int(os.getenv("INGEST_PARALLEL_DOCUMENTS", "4"))
+SPOOL_COPY_BUFFER = 1024 * 1024
+
+_DONE = object()
+
+
+class EmptyDocumentError(ValueError):
+    """Raised when a document yields no text chunks."""
+
+
+class IngestCancelled(Exception):
+    """Raised when an ingest is cancelled through its cancel event."""
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def spool_upload_to_disk(fileobj, suffix: str = ".pdf") -> str:
+    """
+    Copies an uploaded file object to a temporary file in fixed-size pieces.
+    The caller is responsible for removing the returned path.
+    """
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(fileobj, tmp, SPOOL_COPY_BUFFER)
+        return tmp.name
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(SPOOL_COPY_BUFFER), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _document_details(source, filename: str = None) -> dict:
+    """
+    Catalog details for a PDF source: filename, content hash, byte size and page count.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        content_hash, byte_size = hashlib.sha256(source).hexdigest(), len(source)
+    else:
+        content_hash, byte_size = file_sha256(source), os.path.getsize(source)
+    return {"filename": filename, "content_hash": content_hash, "byte_size": byte_size,
+            "page_count": get_page_count(source)}
+
+
+def _batched(iterable, size: int):
+    """
+    Yields lists of at most size consecutive items.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _put(out_queue: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _run_stage(items, out_queue: queue.Queue, stop: threading.Event):
+    """
+    Feeds items into out_queue from a worker thread, forwarding any error downstream.
+    """
+    try:
+        for item in items:
+            if not _put(out_queue, item, stop):
+                return
+        _put(out_queue, _DONE, stop)
+    except BaseException as e:
+        _put(out_queue, _StageError(e), stop)
+
+
+def _drain(in_queue: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            item = in_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, _StageError):
+            raise item.error
+        yield item
+
+
+def _start_stage(items, stop: threading.Event, name: str) -> queue.Queue:
+    out_queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+    # Run in a copy of the caller's context so timing spans reach the request's profile.
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(_run_stage, items, out_queue, stop), name=name, daemon=True).start()
+    return out_queue
+
+
+def _record_chunk_spans(chunks, text_writer):
+    for chunk in chunks:
+        text_writer.add_span(chunk.start, chunk.end)
+        yield chunk.text
+
+
+def _changed_chunks(indexed_chunks, previous_hashes: list):
+    """
+    Drops (index, chunk) pairs whose content is already stored at that index.
+    """
+    for index, chunk in indexed_chunks:
+        if index < len(previous_hashes) and previous_hashes[index] == chunk_hash(chunk):
+            continue
+        yield index, chunk
+
+
+def _embed_chunks(indexed_chunks, progress):
+    """
+    Embeds (index, chunk) pairs as one stream, so the embedding engine packs
+    its own batches and keeps several in flight, and yields
+    (indexes, chunks, embeddings) store batches in order.
+    """
+    pending = deque()
+
+    def texts():
+        for index, chunk in indexed_chunks:
+            pending.append((index, chunk))
+            yield chunk
+
+    for embeddings in _batched(iter_mistral_embeddings(texts()), INGEST_BATCH_SIZE):
+        batch = [pending.popleft() for _ in embeddings]
+        if progress:
+            progress("chunks_embedded", len(batch))
+        yield [index for index, _ in batch], [chunk for _, chunk in batch], embeddings
+
+
+def ingest_pdf(source, title: str, chroma_handler, progress=None, cancel_event: threading.Event = None,
+               filename: str = None) -> dict:
+    """
+    Streams a PDF through parse -> chunk -> embed -> store with bounded queues
+    between the stages, so pages are parsed while earlier batches are embedded
+    and written.
+
+    A PDF whose bytes match the indexed version of the document is skipped
+    entirely. Otherwise, if the document is already indexed (or a previous
+    ingest of it was interrupted), chunks are diffed by content hash against
+    the stored ones and only changed chunks are embedded and written; chunks
+    beyond the new end of the document are deleted.
+
+    Args:
+        source: Path to the PDF on disk (preferred) or its bytes.
+        title (str): Document title used to derive the Chroma title slug.
+        chroma_handler: The ChromaHandler to write chunks to.
+        progress: Optional callback progress(stage, count) for "pages_parsed",
+            "chunks_embedded" and "chunks_written".
+        cancel_event: Optional event that aborts the ingest when set.
+        filename (str): Original upload filename, recorded in the document catalog.
+
+    Returns:
+        dict: The title slug, the document's chunk count, how many chunks were
+        written and whether the content was unchanged.
+
+    If a full (non-incremental) ingest fails or is cancelled after it cleared
+    the previous version, the partly written new version is deleted rather
+    than left to be served.
+
+    Raises:
+        EmptyDocumentError: If the document produced no chunks.
+        IngestCancelled: If cancel_event was set before the ingest finished.
+    """
+    details = _document_details(source, filename)
+    title_slug, entry = chroma_handler.find_document(title)
+    if (entry and entry["chunk_count"] and entry["content_hash"] == details["content_hash"]
+            and chroma_handler.document_store.has_document(title_slug)):
+        if filename:
+            chroma_handler.update_document_details(title_slug, filename=filename)
+        logging.info(f"'{title}' is unchanged since it was last ingested; skipping.")
+        return {"doc_title": title_slug, "chunks": entry["chunk_count"], "written": 0, "unchanged": True}
+
+    previous_hashes = chroma_handler.get_chunk_hashes(title_slug) if entry else []
+    incremental = bool(previous_hashes) and len(previous_hashes) >= entry["chunk_count"]
+    if incremental:
+        # Until the new version is complete, the stored hash must not vouch for it.
+        chroma_handler.update_document_details(title_slug, content_hash=None)
+
+    with chroma_handler.writing(title_slug):
+        stop = threading.Event()
+        # The full text is always rewritten, since every page is re-parsed.
+        text_writer = chroma_handler.document_store.writer()
+
+        def on_pages(texts: list):
+            text_writer.add_pages(texts)
+            if progress:
+                progress("pages_parsed", len(texts))
+
+        # A fresh ingest clears any previous version when its first batch is ready.
+        started = incremental
+        try:
+            indexed_chunks = enumerate(_record_chunk_spans(iter_document_chunks(source, on_pages=on_pages),
+                                                           text_writer))
+            if incremental:
+                indexed_chunks = _changed_chunks(indexed_chunks, previous_hashes)
+            # Chunks are parsed on the embed stage thread while its embedding calls are in flight.
+            embedded_queue = _start_stage(_embed_chunks(indexed_chunks, progress), stop, f"ingest-embed-{title}")
+
+            written = 0
+            for indexes, chunks, embeddings in _drain(embedded_queue, stop):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise IngestCancelled(f"Ingest of '{title}' was cancelled.")
+                if not started:
+                    title_slug = chroma_handler.begin_document(title)
+                    started = True
+                chroma_handler.add_chunk_batch(title_slug, chunks, embeddings, indexes=indexes, replace=incremental)
+                written += len(chunks)
+                if progress:
+                    progress("chunks_written", len(chunks))
+
+            chunk_count = len(text_writer.chunk_spans)
+            if not chunk_count:
+                raise EmptyDocumentError("Document could not be chunked or is empty.")
+            chroma_handler.document_store.commit(text_writer, title_slug)
+            chroma_handler.finish_document(title_slug, chunk_count, changed=bool(written))
+            # Details the caller did not know (e.g. no filename for job or URL ingests) keep their stored value.
+            chroma_handler.update_document_details(title_slug, **{key: value for key, value in details.items()
+                                                                  if value is not None})
+            logging.info(f"Ingested '{title}' as '{title_slug}': {chunk_count} chunks, {written} written.")
+            return {"doc_title": title_slug, "chunks": chunk_count, "written": written, "unchanged": False}
+        except Exception:
+            if started and not incremental:
+                logging.warning(f"Ingest of '{title}' stopped part-way; deleting the partial document.")
+                chroma_handler.delete_document(title_slug)
+            raise
+        finally:
+            stop.set()
+            text_writer.discard()
+
+
+def ingest_upload(fileobj, title: str, chroma_handler, filename: str = None) -> dict:
+    """
+    Spools an uploaded file to disk and ingests it from there.
+    """
+    path = spool_upload_to_disk(fileobj)
+    try:
+        return ingest_pdf(path, title, chroma_handler, filename=filename)
+    finally:
+        os.remove(path)
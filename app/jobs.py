@@ -0,0 +1,270 @@
+# jobs.py
+
+import logging
+import os
+import queue
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.ingest import EmptyDocumentError, IngestCancelled, ingest_pdf
+
+# Uploads submitted as jobs are kept in JOBS_DIR until their job finishes, and
+# job state lives in a SQLite table there, so queued and interrupted jobs are
+# picked up again after a restart. JOB_WORKERS bounds concurrent ingests.
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(".cache", "jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Every server process runs a JobQueue over the same table, so a job is run by
+# the one process that claims it with an atomic UPDATE. Claims are renewed while
+# the job is queued or running; one not renewed for JOB_LEASE_SECONDS belongs to
+# a process that died, and another process takes the job over and resumes it.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+PROGRESS_FIELDS = ("pages_parsed", "chunks_embedded", "chunks_written")
+_JOB_FIELDS = ("id", "title", "filename", "status", "pages_parsed", "chunks_embedded", "chunks_written",
+               "cancel_requested", "error", "created_at", "updated_at")
+
+
+class JobQueue:
+    """
+    In-process ingestion queue backed by a persistent job table.
+    """
+
+    def __init__(self, chroma_handler, directory: str = JOBS_DIR, workers: int = JOB_WORKERS):
+        self.chroma_handler = chroma_handler
+        self.directory = directory
+        self.workers = max(1, workers)
+        self._queue = queue.Queue()
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self.owner = self._new_owner()
+
+        os.makedirs(os.path.join(directory, "uploads"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "jobs.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                pages_parsed INTEGER NOT NULL DEFAULT 0,
+                chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                chunks_written INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "claimed_by" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN claimed_by TEXT")
+            self._db.execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL")
+        if "cancel_requested" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
+        self._db.commit()
+
+    @staticmethod
+    def _new_owner() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            self._db.commit()
+            return cursor
+
+    def _set_status(self, job_id: str, status: str, error: str = None):
+        self._execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                      (status, error, time.time(), job_id))
+
+    def start(self):
+        """
+        Starts the worker threads, claims jobs that no live process holds, and
+        keeps this process's claims alive.
+        """
+        if self._started:
+            return
+        self._started = True
+        # Worker processes forked from one parent each need their own identity.
+        self.owner = self._new_owner()
+        for _ in range(self.workers):
+            threading.Thread(target=self._worker, name="ingest-job-worker", daemon=True).start()
+        self._claim_abandoned()
+        threading.Thread(target=self._keep_claims, name="ingest-job-lease", daemon=True).start()
+
+    def _claim_abandoned(self):
+        """
+        Claims and re-queues unfinished jobs that were never claimed or whose
+        claim was not renewed within JOB_LEASE_SECONDS. The claim is a single
+        conditional UPDATE, so only one process gets each job.
+        """
+        expired = time.time() - JOB_LEASE_SECONDS
+        unfinished = self._execute(
+            "SELECT id FROM jobs WHERE status IN (?, ?) AND (claimed_by IS NULL OR heartbeat < ?) ORDER BY created_at",
+            (QUEUED, RUNNING, expired),
+        ).fetchall()
+        for (job_id,) in unfinished:
+            now = time.time()
+            claimed = self._execute(
+                "UPDATE jobs SET status = ?, claimed_by = ?, heartbeat = ?, updated_at = ? "
+                "WHERE id = ? AND status IN (?, ?) AND (claimed_by IS NULL OR heartbeat < ?)",
+                (QUEUED, self.owner, now, now, job_id, QUEUED, RUNNING, expired),
+            ).rowcount
+            if claimed:
+                logging.info(f"Resuming ingestion job {job_id}.")
+                self._enqueue(job_id)
+
+    def _keep_claims(self):
+        while True:
+            time.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                self._execute("UPDATE jobs SET heartbeat = ? WHERE claimed_by = ? AND status IN (?, ?)",
+                              (time.time(), self.owner, QUEUED, RUNNING))
+                self._claim_abandoned()
+            except Exception as e:
+                logging.error(f"Renewing ingestion job claims failed: {e}", exc_info=True)
+
+    def _enqueue(self, job_id: str):
+        self._cancel_events[job_id] = threading.Event()
+        self._queue.put(job_id)
+
+    def submit(self, fileobj, filename: str, title: str) -> str:
+        """
+        Persists an upload and queues it for ingestion. Returns the job id.
+        """
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.directory, "uploads", f"{job_id}.pdf")
+        fileobj.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out, 1024 * 1024)
+
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, title, filename, path, status, claimed_by, heartbeat, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, title, filename, path, QUEUED, self.owner, now, now, now),
+        )
+        self._enqueue(job_id)
+        return job_id
+
+    def get(self, job_id: str):
+        row = self._execute(f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        job = dict(zip(_JOB_FIELDS, row))
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def list(self, limit: int = 50) -> list:
+        rows = self._execute(
+            f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        jobs = [dict(zip(_JOB_FIELDS, row)) for row in rows]
+        for job in jobs:
+            job["cancel_requested"] = bool(job["cancel_requested"])
+        return jobs
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a queued job, or records a cancel request for a running one in
+        the job table, where the process running it (this one or another) sees
+        it at its next batch. Returns False if the job is unknown or already
+        finished, so it can no longer be stopped.
+        """
+        now = time.time()
+        # A job nobody has started is finished here.
+        if self._execute(
+            "UPDATE jobs SET status = ?, cancel_requested = 1, updated_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, now, job_id, QUEUED),
+        ).rowcount:
+            self._finish(job_id, CANCELLED)
+            return True
+        if not self._execute(
+            "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status = ?",
+            (now, job_id, RUNNING),
+        ).rowcount:
+            return False
+        event = self._cancel_events.get(job_id)
+        if event:
+            event.set()
+        return True
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        row = self._execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _finish(self, job_id: str, status: str, error: str = None):
+        self._set_status(job_id, status, error)
+        self._cancel_events.pop(job_id, None)
+        row = self._execute("SELECT path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row and os.path.exists(row[0]):
+            os.remove(row[0])
+
+    def _worker(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            except Exception as e:
+                logging.error(f"Ingestion job {job_id} crashed: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: str):
+        row = self._execute("SELECT title, filename, path, status, chunks_written FROM jobs WHERE id = ?",
+                            (job_id,)).fetchone()
+        if not row:
+            return
+        title, filename, path, status, chunks_written = row
+        cancel_event = self._cancel_events.get(job_id) or threading.Event()
+        if status != QUEUED or cancel_event.is_set():
+            return
+        if self._cancel_requested(job_id):
+            # Cancelled while running in a process that died before stopping it.
+            self._finish(job_id, CANCELLED)
+            return
+
+        # Pages are re-parsed on resume and chunks the interrupted run already
+        # wrote are skipped by content hash; embedded and written counts carry over.
+        now = time.time()
+        claimed = self._execute(
+            "UPDATE jobs SET status = ?, pages_parsed = 0, chunks_embedded = ?, heartbeat = ?, updated_at = ? "
+            "WHERE id = ? AND status = ? AND claimed_by = ?",
+            (RUNNING, chunks_written, now, now, job_id, QUEUED, self.owner),
+        ).rowcount
+        if not claimed:
+            logging.info(f"Ingestion job {job_id} was taken over by another process; skipping.")
+            return
+
+        def progress(stage: str, count: int):
+            if stage in PROGRESS_FIELDS:
+                self._execute(f"UPDATE jobs SET {stage} = {stage} + ?, updated_at = ? WHERE id = ?",
+                              (count, time.time(), job_id))
+            # A cancel may have been requested through another process.
+            if not cancel_event.is_set() and self._cancel_requested(job_id):
+                cancel_event.set()
+
+        try:
+            ingest_pdf(path, title, self.chroma_handler, progress=progress, cancel_event=cancel_event,
+                       filename=filename)
+            self._finish(job_id, COMPLETED)
+        except IngestCancelled:
+            self._finish(job_id, CANCELLED)
+        except EmptyDocumentError as e:
+            self._finish(job_id, FAILED, str(e))
+        except Exception as e:
+            logging.error(f"Ingestion job {job_id} failed: {e}", exc_info=True)
+            self._finish(job_id, FAILED, str(e))
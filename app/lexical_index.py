@@ -0,0 +1,186 @@
+# lexical_index.py
+
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+
+# Per-document BM25 inverted indexes, persisted as zlib-compressed JSON.
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", os.path.join(".cache", "lexical"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can did do does for from had has have how i if in into is it its "
+    "of on or our so such than that the their them then there these they this those to was we were what "
+    "when where which while who whom why will with would you your".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+class _DocumentIndex:
+    def __init__(self, chunk_ids=None, lengths=None, postings=None):
+        self.chunk_ids = chunk_ids or []
+        self.lengths = lengths or []
+        self.postings = postings or {}  # term -> [[position, term_frequency], ...]
+
+    def add(self, ids: list, texts: list):
+        for chunk_id, text in zip(ids, texts):
+            position = len(self.chunk_ids)
+            tokens = tokenize(text)
+            self.chunk_ids.append(chunk_id)
+            self.lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append([position, tf])
+
+    def remove(self, ids: list):
+        """
+        Drops the given chunks and renumbers the remaining positions.
+        """
+        removed = set(ids)
+        positions = {}
+        for position, chunk_id in enumerate(self.chunk_ids):
+            if chunk_id not in removed:
+                positions[position] = len(positions)
+        if len(positions) == len(self.chunk_ids):
+            return
+        self.chunk_ids = [self.chunk_ids[position] for position in positions]
+        self.lengths = [self.lengths[position] for position in positions]
+        postings = {}
+        for term, entries in self.postings.items():
+            kept = [[positions[position], tf] for position, tf in entries if position in positions]
+            if kept:
+                postings[term] = kept
+        self.postings = postings
+
+    def search(self, query_terms: list, k: int) -> list:
+        n = len(self.chunk_ids)
+        if not n:
+            return []
+        avg_length = (sum(self.lengths) / n) or 1.0
+        scores = {}
+        for term in set(query_terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, tf in postings:
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[position] / avg_length)
+                scores[position] = scores.get(position, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.chunk_ids[position], score) for position, score in ranked]
+
+    def to_bytes(self) -> bytes:
+        payload = {"chunk_ids": self.chunk_ids, "lengths": self.lengths, "postings": self.postings}
+        return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        payload = json.loads(zlib.decompress(data))
+        return cls(payload["chunk_ids"], payload["lengths"], payload["postings"])
+
+
+class LexicalIndex:
+    """
+    BM25 indexes keyed by document title slug, kept in memory and on disk.
+    Changes made while a document is being ingested stay in memory until save().
+    """
+
+    def __init__(self, directory: str = LEXICAL_INDEX_DIR):
+        self.directory = directory
+        self._indexes = {}  # title slug -> (index, mtime of the file it was read from)
+        self._unsaved = {}  # title slug -> index with changes not yet written
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, title_slug: str) -> str:
+        safe = re.sub(r"[^\w\-]", "_", title_slug)
+        return os.path.join(self.directory, f"{safe}.bm25.z")
+
+    def _load(self, title_slug: str):
+        index = self._unsaved.get(title_slug)
+        if index is not None:
+            return index
+        path = self._path(title_slug)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            # Deleted, possibly by another process.
+            self._indexes.pop(title_slug, None)
+            return None
+        cached = self._indexes.get(title_slug)
+        if cached is not None and cached[1] == mtime:
+            return cached[0]
+        # Not read yet, or rewritten by another process since.
+        with open(path, "rb") as f:
+            index = _DocumentIndex.from_bytes(f.read())
+        self._indexes[title_slug] = (index, mtime)
+        return index
+
+    def has_document(self, title_slug: str) -> bool:
+        with self._lock:
+            return self._load(title_slug) is not None
+
+    def add(self, title_slug: str, ids: list, texts: list):
+        with self._lock:
+            index = self._load(title_slug) or _DocumentIndex()
+            index.add(ids, texts)
+            self._unsaved[title_slug] = index
+
+    def delete_chunks(self, title_slug: str, ids: list):
+        with self._lock:
+            index = self._load(title_slug)
+            if index is None:
+                return
+            index.remove(ids)
+            self._unsaved[title_slug] = index
+
+    def save(self, title_slug: str):
+        """
+        Writes a document's index to disk once its ingest is complete.
+        """
+        with self._lock:
+            index = self._unsaved.pop(title_slug, None)
+            if index is None:
+                return
+            path = self._path(title_slug)
+            with open(path + ".tmp", "wb") as f:
+                f.write(index.to_bytes())
+            os.replace(path + ".tmp", path)
+            self._indexes[title_slug] = (index, os.stat(path).st_mtime_ns)
+
+    def delete(self, title_slug: str):
+        with self._lock:
+            self._indexes.pop(title_slug, None)
+            self._unsaved.pop(title_slug, None)
+            path = self._path(title_slug)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def search(self, title_slug: str, query: str, k: int = 10) -> list:
+        """
+        Returns up to k (chunk_id, score) pairs ranked by BM25.
+        """
+        with self._lock:
+            index = self._load(title_slug)
+        if index is None:
+            return []
+        return index.search(tokenize(query), k)
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """
+    Fuses several ranked id lists; returns ids ordered by summed 1 / (k + rank).
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return [item_id for item_id, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
@@ -1,25 +1,48 @@
 # main.py
-from fastapi import FastAPI, File, UploadFile, Query, HTTPException
+import time
+
+# Measured from here to the end of this module; see IMPORT_TIME_BUDGET_MS.
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, File, UploadFile, Query, HTTPException, Request
 from typing import List, Union
+import asyncio
 import os
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 import logging
 import uuid
-import psycopg2
+
+import requests
 
 # Configure logging for the FastAPI app
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- New Imports for ChromaDB and LangChain ---
 from app.chroma_handler import ChromaHandler
-from app.extractor import extract_and_chunk_text
-from app.pdf_parser import parse_pdf_pages_generator
-from app.rag_qa import ask_question, get_mistral_embedding
-from app.citation_manager import format_references, extract_references
+from app.clients import readiness, warm_up, WARMUP_ON_STARTUP
+from app.metrics import PROFILING_ENABLED, render_metrics, request_duration, span, start_profile, stop_profile
+from app.ingest import ingest_upload, EmptyDocumentError, INGEST_PARALLEL_DOCUMENTS
+from app.jobs import CANCELLED, JobQueue
+from app.parse_pool import start_parse_pool
+from app.answer_cache import AnswerCache, ANSWER_CACHE_ENABLED
+from app.rag_qa import ask_question, ask_question_limited, build_question_prompt, get_mistral_embedding, \
+    get_mistral_embeddings, get_embedding_cache_stats
+from app.citation_manager import get_formatted_citations, locate_reference_section, split_reference_entries, \
+    parse_reference_fields, get_reference_entries, batch_reference_entries, format_references_prompt, \
+    citations_cache_key
+from app.completion_cache import completion_cache
+from app.context_builder import build_context, chunk_position, CONTEXT_CANDIDATES, PASSAGE_SEPARATOR
+from app.embedding_engine import estimate_tokens
 from app.paper_search import search_all_sources
-from app.extract_from_url import extract_initial_summary_from_url, ask_question_from_url
-from app.startup import mistral_api as startup_mistral_api  # Renamed to avoid conflicts
+from app.search_cache import get_search_cache_stats
+from app.extract_from_url import extract_initial_summary_from_url, ask_question_from_url, \
+    stream_initial_summary_from_url, stream_question_from_url
+from app.startup import mistral_api_stream
+from app.streaming import sse_event, sse_from_deltas, sse_response, single_delta
+from app.url_documents import url_document_cache, BlockedUrlError, UnsupportedUrlDocument
+from app.summarizer import summarize_chunks, reduce_chunks, cached_final_summary, store_final_summary
 from dotenv import load_dotenv
 
 app = FastAPI(title="Scholar Chat AI")
@@ -28,6 +51,93 @@ load_dotenv()
 # Initialize ChromaHandler globally
 chroma_handler = ChromaHandler()
 
+# Background ingestion queue; workers start (and resume unfinished jobs) on app startup
+job_queue = JobQueue(chroma_handler)
+
+# Answers to /ask/ questions, dropped whenever their document changes
+answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
+if answer_cache:
+    chroma_handler.add_invalidation_listener(answer_cache.invalidate)
+
+
+# Importing the app must not open network connections or load heavy libraries;
+# a warning is logged on startup when the import exceeds this budget.
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+import_time_ms = (time.perf_counter() - _import_started) * 1000
+
+# /ask/batch limits: questions per request and answers generated at once per request.
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "100"))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "4"))
+
+
+@app.on_event("startup")
+def start_workers():
+    # The parse pool comes up before the job queue resumes any ingest that would use it.
+    start_parse_pool()
+    job_queue.start()
+    chroma_handler.start_catalog_reconciler()
+
+
+@app.on_event("startup")
+def report_cold_start():
+    if import_time_ms > IMPORT_TIME_BUDGET_MS:
+        logging.warning(f"App import took {import_time_ms:.0f} ms, over the {IMPORT_TIME_BUDGET_MS:.0f} ms budget.")
+    else:
+        logging.info(f"App import took {import_time_ms:.0f} ms.")
+    if WARMUP_ON_STARTUP:
+        warm_up()
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """
+    Records request latency by route. With PROFILING_ENABLED, a request sent with
+    "X-Profile: 1" gets its per-stage breakdown back in a Server-Timing header
+    (for streamed responses, only the work done before streaming starts).
+    """
+    profile_token = None
+    if PROFILING_ENABLED and request.headers.get("x-profile") in ("1", "true"):
+        profile_token, profile = start_profile()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if profile_token is not None:
+            response.headers["Server-Timing"] = profile.server_timing()
+        return response
+    finally:
+        if profile_token is not None:
+            stop_profile(profile_token)
+        route = request.scope.get("route")
+        request_duration.observe(time.perf_counter() - started, request.method,
+                                 route.path if route else "unmatched", status)
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus text exposition of the stage and request histograms.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/healthz")
+def liveness():
+    """
+    Liveness probe: the process is up and serving requests. Never touches dependencies.
+    """
+    return {"status": "ok", "import_time_ms": round(import_time_ms, 1)}
+
+
+@app.get("/readyz")
+def readiness_probe():
+    """
+    Readiness probe: the Mistral client can be created and the vector store is reachable.
+    """
+    status = readiness()
+    return JSONResponse(content=status, status_code=200 if status["ready"] else 503)
+
 
 # --- Helper Functions (Updated) ---
 
@@ -38,35 +148,52 @@ def extract_title(file: UploadFile) -> str:
 
 def get_full_document_text(title: str) -> str:
     """
-    Retrieves the full text of a document from the database using ChromaHandler.
+    Retrieves the full text of a document, in page order, from the document store.
     """
-    full_text_chunks = chroma_handler.get_all_chunks_for_document(title)
-    if not full_text_chunks:
+    full_text = chroma_handler.get_document_text(title)
+    if not full_text:
         raise HTTPException(status_code=404, detail=f"Document with title '{title}' not found.")
 
-    return "\n".join(full_text_chunks)
+    return full_text
 
 
-def extract_insights(title: str) -> dict:
-    """
-    Extracts key insights from a document by retrieving its full text
-    and using a Mistral API call.
-    """
-    full_text = get_full_document_text(title)
-    prompt = f"""
+INSIGHTS_PROMPT = """
 You are an expert research assistant.
 Read the following paper text and extract the key insights, findings, and contributions.
 Format the output in markdown format
 
 Paper text:
 \"\"\"
-{full_text}
+{text}
 \"\"\"
 
 Output:
 """
+
+
+URL_SUMMARY_PROMPT = """
+Please provide a concise summary and key insights from this document.
+Format the output in markdown format
+
+Document text:
+\"\"\"
+{text}
+\"\"\"
+
+Output:
+"""
+
+
+def extract_insights(title: str) -> dict:
+    """
+    Extracts key insights from a document by summarising its chunks with a
+    map-reduce pass over the Mistral API.
+    """
+    chunks = chroma_handler.get_document_pages(title)
+    if not chunks:
+        raise HTTPException(status_code=404, detail=f"Document with title '{title}' not found.")
     try:
-        response = startup_mistral_api(prompt)
+        response = summarize_chunks(chunks, INSIGHTS_PROMPT)
         return {"extracted_info": response}
     except Exception as e:
         logging.error(f"Error extracting insights from Mistral API: {e}")
@@ -79,6 +206,12 @@ class AskRequest(BaseModel):
     question: str
 
 
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+    # Title slugs to search; omitted or empty searches the whole library.
+    titles: Union[List[str], None] = None
+
+
 class CitationRequest(BaseModel):
     title: str
     style: str = "APA"
@@ -93,23 +226,17 @@ class UrlRequest(BaseModel):
 @app.post("/upload/")
 async def upload_paper(file: UploadFile = File(...)):
     try:
-        contents = await file.read()
         title = extract_title(file)
 
-        # Use a generator to parse the PDF, then chunk the text with LangChain.
-        text_generator = parse_pdf_pages_generator(contents)
-        chunks = extract_and_chunk_text(text_generator)
-
-        if not chunks:
-            raise HTTPException(status_code=400, detail="Document could not be chunked or is empty.")
-
-        # Get embeddings for all chunks from Mistral
-        embeddings = [get_mistral_embedding(text) for text in chunks]
-
-        # Add the chunks and embeddings to ChromaDB
-        chroma_handler.add_chunks_with_embeddings_to_chroma(chunks, embeddings, title)
+        # Stream the spooled upload from disk through parse -> chunk -> embed -> store
+        # in a worker thread so the event loop stays free.
+        result = await run_in_threadpool(ingest_upload, file.file, title, chroma_handler, file.filename)
 
-        return {"doc_title": title, "message": "PDF uploaded and indexed."}
+        if result["unchanged"]:
+            return {"doc_title": title, "message": "PDF is unchanged since it was last indexed."}
+        return {"doc_title": title, "message": "PDF uploaded and indexed.", "chunks_written": result["written"]}
+    except EmptyDocumentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"Error during PDF upload: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An error occurred during upload: {e}")
@@ -117,62 +244,259 @@ async def upload_paper(file: UploadFile = File(...)):
 
 @app.post("/upload_multiple/")
 async def upload_multiple_pdfs(files: List[UploadFile] = File(...)):
-    titles = []
+    # Documents are ingested in parallel; parsing and chunking run in the process pool.
+    semaphore = asyncio.Semaphore(INGEST_PARALLEL_DOCUMENTS)
+
+    async def ingest_one(file: UploadFile) -> str:
+        async with semaphore:
+            try:
+                title = extract_title(file)
+
+                # Stream the spooled upload from disk through parse -> chunk -> embed -> store
+                await run_in_threadpool(ingest_upload, file.file, title, chroma_handler, file.filename)
+
+                return title
+            except EmptyDocumentError as e:
+                logging.error(f"Error processing {file.filename}: {e}")
+                return f"Error processing {file.filename}: {e}"
+            except Exception as e:
+                logging.error(f"Error processing {file.filename}: {e}", exc_info=True)
+                return f"Error processing {file.filename}: {e}"
+
+    titles = await asyncio.gather(*(ingest_one(file) for file in files))
+
+    return {"doc_titles": titles, "message": f"{len(titles)} PDFs uploaded and indexed. Some may have failed."}
+
+
+@app.post("/jobs/upload/")
+async def submit_upload_jobs(files: List[UploadFile] = File(...)):
+    """
+    Queues one ingestion job per uploaded PDF and returns their ids immediately.
+    """
+    jobs = []
     for file in files:
-        try:
-            contents = await file.read()
-            title = extract_title(file)
+        title = extract_title(file)
+        job_id = await run_in_threadpool(job_queue.submit, file.file, file.filename, title)
+        jobs.append({"job_id": job_id, "doc_title": title})
+    return {"jobs": jobs, "message": f"{len(jobs)} PDFs queued for indexing."}
 
-            # Use a generator to parse the PDF, then chunk the text with LangChain.
-            text_generator = parse_pdf_pages_generator(contents)
-            chunks = extract_and_chunk_text(text_generator)
 
-            if not chunks:
-                logging.error(f"Error processing {file.filename}: Document could not be chunked or is empty.")
-                titles.append(f"Error processing {file.filename}: Document could not be chunked or is empty.")
-                continue
+@app.get("/jobs/")
+def list_jobs(limit: int = 50):
+    return {"jobs": job_queue.list(limit)}
 
-            # Get embeddings for all chunks from Mistral
-            embeddings = [get_mistral_embedding(text) for text in chunks]
 
-            # Add the chunks and embeddings to ChromaDB
-            chroma_handler.add_chunks_with_embeddings_to_chroma(chunks, embeddings, title)
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Reports a job's status and per-stage progress (pages parsed, chunks embedded, chunks written).
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job
 
-            titles.append(title)
-        except Exception as e:
-            titles.append(f"Error processing {file.filename}: {e}")
-            logging.error(f"Error processing {file.filename}: {e}", exc_info=True)
 
-    return {"doc_titles": titles, "message": f"{len(titles)} PDFs uploaded and indexed. Some may have failed."}
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """
+    Cancels a queued job, or asks a running one to stop at its next batch.
+    """
+    if not job_queue.cancel(job_id):
+        job = job_queue.get(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' is already {job['status']} and cannot be stopped.")
+    job = job_queue.get(job_id)
+    if job and job["status"] == CANCELLED:
+        return {"message": f"Job {job_id} was cancelled."}
+    return {"message": f"Cancellation requested for job {job_id}; it stops at its next batch."}
+
+
+def retrieve_context(title: str, question_text: str) -> tuple:
+    """
+    Returns (context passages, query embedding or None) for a question: hybrid
+    BM25 + vector candidates, de-duplicated and diversified with MMR, packed into
+    the context token budget. The embedding is None when the lexical ranking was
+    decisive and no embedding call was made.
+    """
+    with span("retrieve", payload_bytes=len(question_text)) as retrieve_span:
+        candidates, query_embedding = chroma_handler.hybrid_candidates(
+            question_text, get_mistral_embedding, doc_title=title, n_results=CONTEXT_CANDIDATES,
+            include_embeddings=True
+        )
+        passages = build_context(candidates, query_embedding)
+        retrieve_span.tokens = sum(estimate_tokens(passage) for passage in passages)
+    return passages, query_embedding
+
+
+def lookup_cached_answer(title: str, question_text: str) -> tuple:
+    """
+    Checks the exact answer cache, then retrieves context. Returns
+    (cached answer or None, context passages, query embedding or None).
+    Near-duplicate questions are matched on the embedding retrieval already
+    computed, so the semantic lookup never adds an embedding call of its own
+    and is skipped when the lexical ranking was decisive.
+    """
+    if answer_cache:
+        cached_answer = answer_cache.get_exact(title, question_text)
+        if cached_answer is not None:
+            return cached_answer, [], None
+    passages, query_embedding = retrieve_context(title, question_text)
+    if answer_cache and query_embedding is not None:
+        cached_answer = answer_cache.get_similar(title, query_embedding)
+        if cached_answer is not None:
+            return cached_answer, passages, query_embedding
+    return None, passages, query_embedding
+
+
+def no_context_answer(title: str) -> str:
+    return f"No relevant information found for the question in document '{title}'."
 
 
 @app.post("/ask/")
 def question(request: AskRequest):
     try:
         logging.info(f"Received question request for title '{request.title}': {request.question}")
+        started = time.perf_counter()
 
-        # Generate embedding for the query
-        query_embedding = get_mistral_embedding(request.question)
-        if not query_embedding:
-            raise HTTPException(status_code=500, detail="Failed to generate embedding for the query.")
-
-        # Search for similar chunks in ChromaDB
-        context_chunks = chroma_handler.get_similar_chunks(query_embedding, doc_title=request.title)
+        cached_answer, context_chunks, query_embedding = lookup_cached_answer(request.title, request.question)
+        if cached_answer is not None:
+            return {"answer": cached_answer}
 
         if not context_chunks:
-            return JSONResponse(
-                content={"answer": f"No relevant information found for the question in document '{request.title}'."},
-                status_code=200)
+            return JSONResponse(content={"answer": no_context_answer(request.title)}, status_code=200)
 
-        context_string = "\n".join(context_chunks)
+        context_string = PASSAGE_SEPARATOR.join(context_chunks)
         answer = ask_question(context_string, request.question)
 
+        if answer_cache and not answer.startswith("Error calling Mistral API"):
+            latency_ms = (time.perf_counter() - started) * 1000
+            answer_cache.put(request.title, request.question, query_embedding, answer, latency_ms)
+
         return {"answer": answer}
     except Exception as e:
         logging.error(f"Error asking question for title '{request.title}': {e}", exc_info=True)
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@app.post("/ask/stream")
+async def question_stream(request: AskRequest, http_request: Request):
+    """
+    Streaming variant of /ask/: answer tokens are sent as server-sent events.
+    """
+    logging.info(f"Received streaming question request for title '{request.title}': {request.question}")
+    started = time.perf_counter()
+
+    cached_answer, context_chunks, query_embedding = await run_in_threadpool(
+        lookup_cached_answer, request.title, request.question
+    )
+    if cached_answer is not None:
+        return sse_response(sse_from_deltas(http_request, single_delta(cached_answer)))
+    if not context_chunks:
+        return sse_response(sse_from_deltas(http_request, single_delta(no_context_answer(request.title))))
+
+    def remember(answer: str):
+        if answer_cache:
+            latency_ms = (time.perf_counter() - started) * 1000
+            answer_cache.put(request.title, request.question, query_embedding, answer, latency_ms)
+
+    prompt = build_question_prompt(PASSAGE_SEPARATOR.join(context_chunks), request.question)
+    return sse_response(sse_from_deltas(http_request, mistral_api_stream(prompt), on_complete=remember))
+
+
+def retrieve_batch_contexts(titles: list, questions: list) -> list:
+    """
+    Embeds all questions in one call and retrieves their candidates with one
+    multi-query vector search. Returns (passages, source titles) per question.
+    """
+    query_embeddings = get_mistral_embeddings(questions)
+    with span("retrieve", payload_bytes=sum(len(question) for question in questions)):
+        batches = chroma_handler.batch_candidates(questions, query_embeddings, doc_titles=titles,
+                                                  n_results=CONTEXT_CANDIDATES, include_embeddings=True)
+    contexts = []
+    for candidates, query_embedding in zip(batches, query_embeddings):
+        passages = build_context(candidates, query_embedding)
+        sources = list(dict.fromkeys((chunk_position(candidate["id"]) or (None,))[0] for candidate in candidates))
+        contexts.append((passages, [source for source in sources if source], query_embedding))
+    return contexts
+
+
+@app.post("/ask/batch")
+async def question_batch(request: AskBatchRequest, http_request: Request):
+    """
+    Answers many questions against one, several or all documents.
+
+    Retrieval is batched (one embeddings call, one vector query); answers are
+    generated concurrently under the shared ask rate limit and sent as
+    server-sent events in the order they finish, each tagged with its index.
+    """
+    questions = [question.strip() for question in request.questions]
+    if not questions or any(not question for question in questions):
+        raise HTTPException(status_code=400, detail="questions must be a non-empty list of non-empty strings.")
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {ASK_BATCH_MAX_QUESTIONS} questions per batch.")
+    titles = list(dict.fromkeys(request.titles or []))
+    logging.info(f"Received batch of {len(questions)} questions over {len(titles) or 'all'} documents.")
+
+    contexts = await run_in_threadpool(retrieve_batch_contexts, titles, questions)
+    single_title = titles[0] if len(titles) == 1 else None
+    semaphore = asyncio.Semaphore(ASK_BATCH_CONCURRENCY)
+
+    def answer(question_text: str, passages: list, query_embedding) -> str:
+        # Answers for a single document go through the same cache as /ask/
+        if single_title and answer_cache:
+            cached_answer = answer_cache.get_exact(single_title, question_text)
+            if cached_answer is None:
+                cached_answer = answer_cache.get_similar(single_title, query_embedding)
+            if cached_answer is not None:
+                return cached_answer
+        started = time.perf_counter()
+        answer_text = ask_question_limited(PASSAGE_SEPARATOR.join(passages), question_text)
+        if single_title and answer_cache and not answer_text.startswith("Error calling Mistral API"):
+            latency_ms = (time.perf_counter() - started) * 1000
+            answer_cache.put(single_title, question_text, query_embedding, answer_text, latency_ms)
+        return answer_text
+
+    async def answer_one(index: int) -> dict:
+        passages, sources, query_embedding = contexts[index]
+        result = {"index": index, "question": questions[index], "sources": sources}
+        if not passages:
+            scope = f"document '{single_title}'" if single_title else "the selected documents"
+            return {**result, "answer": f"No relevant information found for the question in {scope}."}
+        try:
+            async with semaphore:
+                return {**result, "answer": await run_in_threadpool(answer, questions[index], passages, query_embedding)}
+        except Exception as e:
+            logging.error(f"Error answering batched question {index}: {e}", exc_info=True)
+            return {**result, "error": str(e)}
+
+    async def events():
+        tasks = [asyncio.ensure_future(answer_one(index)) for index in range(len(questions))]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield sse_event(await finished)
+                if await http_request.is_disconnected():
+                    logging.info("Client disconnected from /ask/batch; cancelling remaining questions.")
+                    return
+            yield sse_event({}, event="done")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return sse_response(events())
+
+
+@app.get("/answer_cache_stats/")
+def answer_cache_stats():
+    """
+    Reports answer cache hit rate and the generation latency it saved.
+    """
+    if not answer_cache:
+        return JSONResponse(content={"enabled": False}, status_code=200)
+    return JSONResponse(content={"enabled": True, **answer_cache.stats()}, status_code=200)
+
+
 @app.get("/extract/")
 def extract(title: str = Query(...)):
     """
@@ -187,6 +511,27 @@ def extract(title: str = Query(...)):
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@app.get("/extract/stream")
+async def extract_stream(http_request: Request, title: str = Query(...)):
+    """
+    Streaming variant of /extract/. The map-reduce passes run first; the final
+    insights completion is streamed as server-sent events.
+    """
+    logging.info(f"Received streaming extract insights request for title: {title}")
+    chunks = await run_in_threadpool(chroma_handler.get_document_pages, title)
+    if not chunks:
+        raise HTTPException(status_code=404, detail=f"Document with title '{title}' not found.")
+
+    text = await run_in_threadpool(reduce_chunks, chunks)
+    cached = cached_final_summary(INSIGHTS_PROMPT, text)
+    if cached is not None:
+        return sse_response(sse_from_deltas(http_request, single_delta(cached)))
+
+    deltas = mistral_api_stream(INSIGHTS_PROMPT.format(text=text))
+    return sse_response(sse_from_deltas(http_request, deltas,
+                                        on_complete=lambda output: store_final_summary(INSIGHTS_PROMPT, text, output)))
+
+
 @app.get("/get_all_titles/")
 def get_all_titles():
     try:
@@ -198,31 +543,116 @@ def get_all_titles():
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@app.get("/documents/")
+def list_documents(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500), q: Union[str, None] = None,
+                   sort: str = "title_slug", descending: bool = False):
+    """
+    Paginated, filterable listing of the document catalog.
+    """
+    try:
+        return chroma_handler.list_documents(offset=offset, limit=limit, query=q, sort=sort, descending=descending)
+    except Exception as e:
+        logging.error(f"Error listing documents: {e}", exc_info=True)
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@app.get("/documents/{title}/pages")
+def get_document_pages(title: str, first: int = Query(1, ge=1), last: Union[int, None] = Query(None, ge=1)):
+    """
+    Returns the stored text of pages first..last (1-based, inclusive) of a document.
+    """
+    pages = chroma_handler.document_store.get_pages(title, first - 1, last - 1 if last else None)
+    if pages is None:
+        raise HTTPException(status_code=404, detail=f"No stored text for document '{title}'.")
+    return {"title": title, "first": first, "pages": pages}
+
+
+@app.get("/documents/{title}/chunk_pages")
+def get_chunk_pages(title: str, chunk_id: List[str] = Query(...)):
+    """
+    Maps retrieved chunk ids to the 1-based page ranges they were cut from, for expansion or page citations.
+    """
+    return {"title": title, "chunk_pages": chroma_handler.get_chunk_pages(title, chunk_id)}
+
+
 @app.post("/citations/")
 def get_citations(request: CitationRequest):
     try:
         logging.info(f"Received citation request for title '{request.title}' in style: {request.style}")
 
-        full_text_chunks = chroma_handler.get_all_chunks_for_document(request.title)
-
-        if not full_text_chunks:
-            return JSONResponse(content={"citations": f"No content found for '{request.title}' to generate citations."},
-                                status_code=200)
-
-        full_text = "\n".join(full_text_chunks)
+        full_text = chroma_handler.get_document_text(request.title)
 
         if not full_text:
             logging.warning(f"No content found for '{request.title}' to generate citations.")
             return JSONResponse(content={"citations": f"No content found for '{request.title}' to generate citations."},
                                 status_code=200)
 
-        refs = extract_references(full_text)
-        formatted = format_references(refs, style=request.style)
+        formatted = get_formatted_citations(full_text, style=request.style)
         return JSONResponse(content={"citations": formatted}, status_code=200)
     except Exception as e:
         logging.error(f"Error generating citations for title '{request.title}': {e}", exc_info=True)
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+@app.post("/citations/stream")
+async def get_citations_stream(request: CitationRequest, http_request: Request):
+    """
+    Streaming variant of /citations/: each batch of references is formatted and streamed in order.
+    """
+    logging.info(f"Received streaming citation request for title '{request.title}' in style: {request.style}")
+    full_text = await run_in_threadpool(chroma_handler.get_document_text, request.title)
+    if not full_text:
+        message = f"No content found for '{request.title}' to generate citations."
+        return sse_response(sse_from_deltas(http_request, single_delta(message)))
+
+    cache_key = citations_cache_key(full_text, request.style)
+    cached = completion_cache.get(cache_key)
+    if cached is not None:
+        return sse_response(sse_from_deltas(http_request, single_delta(cached)))
+
+    entries = await run_in_threadpool(get_reference_entries, full_text)
+
+    async def formatted_batches():
+        for i, batch in enumerate(batch_reference_entries(entries)):
+            if i:
+                yield "\n\n"
+            stream = mistral_api_stream(format_references_prompt(batch, request.style))
+            try:
+                async for delta in stream:
+                    yield delta
+            finally:
+                await stream.aclose()
+
+    return sse_response(sse_from_deltas(http_request, formatted_batches(),
+                                        on_complete=lambda output: completion_cache.put(cache_key, output.strip())))
+
+
+@app.get("/embedding_cache_stats/")
+def embedding_cache_stats():
+    """
+    Reports embedding cache hits and misses; every hit is an embeddings API call saved.
+    """
+    return JSONResponse(content=get_embedding_cache_stats(), status_code=200)
+
+
+@app.get("/references/")
+def get_references(title: str = Query(...)):
+    """
+    Returns the locally parsed reference entries of a document, without calling the model.
+    """
+    try:
+        full_text = chroma_handler.get_document_text(title)
+        if not full_text:
+            raise HTTPException(status_code=404, detail=f"Document with title '{title}' not found.")
+        section = locate_reference_section(full_text)
+        entries = split_reference_entries(section) if section else []
+        return {"references": [parse_reference_fields(entry) for entry in entries]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error parsing references for title '{title}': {e}", exc_info=True)
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
 # --- DELETE ENDPOINT ---
 @app.delete("/delete/{title}")
 def delete_document(title: str):
@@ -250,10 +680,54 @@ def search_papers(query: str, max_results: int = 5):
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@app.get("/search_cache_stats/")
+def search_cache_stats():
+    return JSONResponse(content=get_search_cache_stats(), status_code=200)
+
+
+def index_url_document(url: str):
+    """
+    Downloads (or revalidates) and indexes the PDF at url, returning its title slug.
+    Returns None when the URL cannot be handled locally; callers then fall back to
+    Mistral's Document QnA, which fetches the URL itself. URLs that target
+    non-public addresses are rejected with a 400.
+    """
+    try:
+        return url_document_cache.index(url, chroma_handler)
+    except BlockedUrlError as e:
+        logging.warning(f"Rejected URL {url}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except (UnsupportedUrlDocument, requests.RequestException, EmptyDocumentError) as e:
+        logging.info(f"Falling back to Document QnA for {url}: {e}")
+        return None
+
+
+def summarize_url_document(title_slug: str) -> str:
+    return summarize_chunks(chroma_handler.get_document_pages(title_slug), URL_SUMMARY_PROMPT)
+
+
+def answer_url_question(title_slug: str, question_text: str) -> str:
+    started = time.perf_counter()
+    cached_answer, context_chunks, query_embedding = lookup_cached_answer(title_slug, question_text)
+    if cached_answer is not None:
+        return cached_answer
+    if not context_chunks:
+        return no_context_answer(title_slug)
+    answer = ask_question(PASSAGE_SEPARATOR.join(context_chunks), question_text)
+    if answer_cache and not answer.startswith("Error calling Mistral API"):
+        latency_ms = (time.perf_counter() - started) * 1000
+        answer_cache.put(title_slug, question_text, query_embedding, answer, latency_ms)
+    return answer
+
+
 @app.post("/extract_from_url/")
 async def extract_url_content(request: UrlRequest):
     try:
         logging.info(f"Received request to extract from URL: {request.url}")
+        title_slug = await run_in_threadpool(index_url_document, request.url)
+        if title_slug:
+            summary = await run_in_threadpool(summarize_url_document, title_slug)
+            return JSONResponse(content={"summary": summary, "doc_title": title_slug}, status_code=200)
         summary = extract_initial_summary_from_url(request.url)
         if "Error:" in summary:
             raise HTTPException(status_code=500, detail=summary)
@@ -272,6 +746,11 @@ async def ask_question_url_paper(request: UrlRequest):
 
     try:
         logging.info(f"Received question '{request.question}' for URL: {request.url}")
+        # The document is downloaded and indexed once; follow-up questions only retrieve chunks.
+        title_slug = await run_in_threadpool(index_url_document, request.url)
+        if title_slug:
+            answer = await run_in_threadpool(answer_url_question, title_slug, request.question)
+            return JSONResponse(content={"answer": answer, "doc_title": title_slug}, status_code=200)
         answer = ask_question_from_url(request.url, request.question)
         if "Error:" in answer:
             raise HTTPException(status_code=500, detail=answer)
@@ -281,3 +760,54 @@ async def ask_question_url_paper(request: UrlRequest):
     except Exception as e:
         logging.error(f"Error asking question about URL '{request.url}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to get answer from URL: {e}")
+
+
+@app.post("/extract_from_url/stream")
+async def extract_url_content_stream(request: UrlRequest, http_request: Request):
+    if not request.url:
+        raise HTTPException(status_code=400, detail="URL is required.")
+    logging.info(f"Received streaming request to extract from URL: {request.url}")
+    title_slug = await run_in_threadpool(index_url_document, request.url)
+    if not title_slug:
+        return sse_response(sse_from_deltas(http_request, stream_initial_summary_from_url(request.url)))
+
+    chunks = await run_in_threadpool(chroma_handler.get_document_pages, title_slug)
+    text = await run_in_threadpool(reduce_chunks, chunks)
+    cached = cached_final_summary(URL_SUMMARY_PROMPT, text)
+    if cached is not None:
+        return sse_response(sse_from_deltas(http_request, single_delta(cached)))
+    deltas = mistral_api_stream(URL_SUMMARY_PROMPT.format(text=text))
+    return sse_response(sse_from_deltas(http_request, deltas,
+                                        on_complete=lambda output: store_final_summary(URL_SUMMARY_PROMPT, text, output)))
+
+
+@app.post("/ask_url_paper/stream")
+async def ask_question_url_paper_stream(request: UrlRequest, http_request: Request):
+    if not request.url or not request.question:
+        raise HTTPException(status_code=400, detail="URL and question are required.")
+    logging.info(f"Received streaming question '{request.question}' for URL: {request.url}")
+    title_slug = await run_in_threadpool(index_url_document, request.url)
+    if not title_slug:
+        return sse_response(sse_from_deltas(http_request, stream_question_from_url(request.url, request.question)))
+
+    started = time.perf_counter()
+    cached_answer, context_chunks, query_embedding = await run_in_threadpool(
+        lookup_cached_answer, title_slug, request.question
+    )
+    if cached_answer is not None:
+        return sse_response(sse_from_deltas(http_request, single_delta(cached_answer)))
+    if not context_chunks:
+        return sse_response(sse_from_deltas(http_request, single_delta(no_context_answer(title_slug))))
+
+    def remember(answer: str):
+        if answer_cache:
+            latency_ms = (time.perf_counter() - started) * 1000
+            answer_cache.put(title_slug, request.question, query_embedding, answer, latency_ms)
+
+    prompt = build_question_prompt(PASSAGE_SEPARATOR.join(context_chunks), request.question)
+    return sse_response(sse_from_deltas(http_request, mistral_api_stream(prompt), on_complete=remember))
+
+
+@app.get("/url_cache_stats/")
+def url_cache_stats():
+    return JSONResponse(content=url_document_cache.stats(), status_code=200)
@@ -0,0 +1,229 @@
+# metrics.py
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+# Timing spans around the pipeline stages (parse, chunk, embed, store,
+# retrieve, generate), exported in Prometheus text format on /metrics.
+# PROFILING_ENABLED lets a request send "X-Profile: 1" to get its own
+# per-stage breakdown back in a Server-Timing header.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Logged model payloads are cut to this many characters (0 logs sizes only).
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", "300"))
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram keyed by label values.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _format_labels(self.label_names, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            infinity = _format_labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{infinity} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+stage_duration = Histogram("scholar_stage_duration_seconds", "Time spent in a pipeline stage.",
+                           ("stage",), DURATION_BUCKETS)
+stage_tokens = Histogram("scholar_stage_tokens", "Tokens sent to or received from the model per stage call.",
+                         ("stage",), SIZE_BUCKETS)
+stage_payload = Histogram("scholar_stage_payload_bytes", "Payload size handled per stage call.",
+                          ("stage",), SIZE_BUCKETS)
+stage_errors = Counter("scholar_stage_errors_total", "Stage calls that raised.", ("stage",))
+request_duration = Histogram("scholar_request_duration_seconds", "HTTP request latency by route.",
+                             ("method", "route", "status"), DURATION_BUCKETS)
+
+_METRICS = (stage_duration, stage_tokens, stage_payload, stage_errors, request_duration)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class Profile:
+    """
+    Per-request accumulation of stage timings, filled in by every span the request runs.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}  # stage -> {"count", "seconds", "tokens", "bytes"}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, tokens: int = None, payload_bytes: int = None):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0, "tokens": 0, "bytes": 0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["tokens"] += tokens or 0
+            entry["bytes"] += payload_bytes or 0
+
+    def server_timing(self) -> str:
+        """
+        Formats the breakdown as a Server-Timing header value (durations in ms).
+        """
+        with self._lock:
+            parts = [f'{stage};dur={entry["seconds"] * 1000:.1f};desc="{entry["count"]} calls"'
+                     for stage, entry in self.stages.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_profile = ContextVar("profile", default=None)
+
+
+def start_profile():
+    """
+    Starts collecting spans for the current request. Returns (token, profile).
+    """
+    profile = Profile()
+    return _profile.set(profile), profile
+
+
+def stop_profile(token):
+    _profile.reset(token)
+
+
+def propagate_context(fn):
+    """
+    Wraps fn so calls from pool threads run in a copy of the caller's context,
+    letting their spans reach the request's profile.
+    """
+    context = copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def record(stage: str, seconds: float, tokens: int = None, payload_bytes: int = None):
+    """
+    Records a stage duration measured elsewhere, e.g. in a parse worker process.
+    """
+    stage_duration.observe(seconds, stage)
+    if tokens is not None:
+        stage_tokens.observe(tokens, stage)
+    if payload_bytes is not None:
+        stage_payload.observe(payload_bytes, stage)
+    profile = _profile.get()
+    if profile is not None:
+        profile.add(stage, seconds, tokens, payload_bytes)
+
+
+class Span:
+    def __init__(self, stage: str, tokens: int = None, payload_bytes: int = None):
+        self.stage = stage
+        self.tokens = tokens
+        self.payload_bytes = payload_bytes
+
+
+@contextmanager
+def span(stage: str, tokens: int = None, payload_bytes: int = None):
+    """
+    Times the enclosed block as one call of a stage. Token counts and payload
+    sizes known only afterwards can be set on the yielded Span.
+    """
+    current = Span(stage, tokens, payload_bytes)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception:
+        stage_errors.inc(1, stage)
+        raise
+    finally:
+        record(stage, time.perf_counter() - started, current.tokens, current.payload_bytes)
+
+
+def usage_tokens(response):
+    """
+    Total tokens reported by a Mistral response or stream chunk, if any.
+    """
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage else None
+
+
+def truncate_payload(text, limit: int = None) -> str:
+    """
+    Shortens a payload for logging, keeping its total size visible.
+    """
+    limit = LOG_PAYLOAD_CHARS if limit is None else limit
+    text = text if isinstance(text, str) else str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text)} chars]"
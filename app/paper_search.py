@@ -1,12 +1,60 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import xmltodict
 
+from app.search_cache import cached_search
+
+# Per-request timeout for each provider and overall deadline for the fan-out.
+# Sources that miss the deadline are returned empty rather than delaying the response.
+SEARCH_REQUEST_TIMEOUT = float(os.getenv("SEARCH_REQUEST_TIMEOUT", "8"))
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "10"))
+
+
+def _make_session():
+    """
+    Creates a keep-alive session with a connection pool sized for concurrent searches.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = _make_session()
+
+
+class SearchProviderError(RuntimeError):
+    """Raised when a provider answers with an error instead of results."""
+
+
+def _get(url: str, **kwargs) -> requests.Response:
+    """
+    GETs url and raises on non-2xx responses, so throttled or failing providers
+    are reported as errors (and never cached) rather than parsed as empty results.
+    """
+    response = session.get(url, timeout=SEARCH_REQUEST_TIMEOUT, **kwargs)
+    response.raise_for_status()
+    return response
+
+
+# Long-lived pool so a slow source never blocks the response on executor shutdown.
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="paper-search")
+
+
+@cached_search("arxiv")
 def search_arxiv(query, max_results=5):
-    url = f"http://export.arxiv.org/api/query?search_query=all:{query}&start=0&max_results={max_results}"
-    response = requests.get(url)
-    data = xmltodict.parse(response.text)
-    entries = data.get("feed", {}).get("entry", [])
+    url = "http://export.arxiv.org/api/query"
+    params = {"search_query": f"all:{query}", "start": 0, "max_results": max_results}
+    data = xmltodict.parse(_get(url, params=params).text)
+    if not isinstance(data, dict) or not isinstance(data.get("feed"), dict):
+        raise SearchProviderError("arXiv returned an unexpected response.")
+    entries = data["feed"].get("entry", [])
     if isinstance(entries, dict):  # only one result
         entries = [entries]
     return [
@@ -18,10 +66,13 @@ def search_arxiv(query, max_results=5):
         for e in entries
     ]
 
+@cached_search("semantic_scholar")
 def search_semantic_scholar(query, max_results=5):
-    url = f"https://api.semanticscholar.org/graph/v1/paper/search?query={query}&limit={max_results}&fields=title,url,abstract"
-    r = requests.get(url)
-    data = r.json()
+    url = "https://api.semanticscholar.org/graph/v1/paper/search"
+    params = {"query": query, "limit": max_results, "fields": "title,url,abstract"}
+    data = _get(url, params=params).json()
+    if not isinstance(data, dict) or ("data" not in data and "total" not in data):
+        raise SearchProviderError(f"Semantic Scholar returned an unexpected response: {str(data)[:200]}")
     return [
         {
             "title": p["title"],
@@ -31,11 +82,12 @@ def search_semantic_scholar(query, max_results=5):
         for p in data.get("data", [])
     ]
 
+@cached_search("core")
 def search_core(query, max_results=5):
     # CORE Search API via their site search
     headers = {"User-Agent": "Mozilla/5.0"}
-    url = f"https://core.ac.uk/search?q={query}&page=1"
-    resp = requests.get(url, headers=headers)
+    url = "https://core.ac.uk/search"
+    resp = _get(url, params={"q": query, "page": 1}, headers=headers)
     soup = BeautifulSoup(resp.text, "html.parser")
     results = soup.select(".result-title a")[:max_results]
     return [
@@ -47,14 +99,27 @@ def search_core(query, max_results=5):
         for r in results
     ]
 
+@cached_search("pubmed")
 def search_pubmed(query, max_results=5):
-    url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=pubmed&term={query}&retmax={max_results}&retmode=json"
-    ids = requests.get(url).json().get("esearchresult", {}).get("idlist", [])
+    url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+    params = {"db": "pubmed", "term": query, "retmax": max_results, "retmode": "json"}
+    data = _get(url, params=params).json()
+    if "esearchresult" not in data or "ERROR" in data["esearchresult"]:
+        raise SearchProviderError(f"PubMed search failed: {str(data)[:200]}")
+    ids = data["esearchresult"].get("idlist", [])
+    if not ids:
+        return []
+
+    # esummary accepts a comma-separated id list, so fetch every summary in one call.
+    summary_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
+    summary_params = {"db": "pubmed", "id": ",".join(ids), "retmode": "json"}
+    res = _get(summary_url, params=summary_params).json()
+    if "result" not in res:
+        raise SearchProviderError(f"PubMed summary failed: {str(res)[:200]}")
+    result = res["result"]
     summaries = []
     for pmid in ids:
-        summary_url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi?db=pubmed&id={pmid}&retmode=json"
-        res = requests.get(summary_url).json()
-        doc = res.get("result", {}).get(pmid, {})
+        doc = result.get(pmid, {})
         summaries.append({
             "title": doc.get("title", "No title"),
             "summary": doc.get("source", "PubMed entry"),
@@ -62,10 +127,31 @@ def search_pubmed(query, max_results=5):
         })
     return summaries
 
+SEARCH_SOURCES = {
+    "arxiv": search_arxiv,
+    "semantic_scholar": search_semantic_scholar,
+    "core": search_core,
+    "pubmed": search_pubmed,
+}
+
 def search_all_sources(query, max_results=5):
-    return {
-        "arxiv": search_arxiv(query, max_results),
-        "semantic_scholar": search_semantic_scholar(query, max_results),
-        "core": search_core(query, max_results),
-        "pubmed": search_pubmed(query, max_results),
-    }
+    """
+    Queries every provider concurrently and returns whatever finished before the deadline.
+    Sources that fail or time out are returned as empty lists.
+    """
+    futures = {name: _executor.submit(fn, query, max_results) for name, fn in SEARCH_SOURCES.items()}
+    wait(futures.values(), timeout=SEARCH_DEADLINE)
+
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            logging.warning(f"Paper search source '{name}' missed the {SEARCH_DEADLINE}s deadline.")
+            results[name] = []
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logging.error(f"Paper search source '{name}' failed: {e}")
+            results[name] = []
+    return results
@@ -0,0 +1,166 @@
+# parse_pool.py
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.extractor import PAGE_SEPARATOR, iter_chunk_records
+from app.metrics import record
+from app.pdf_parser import get_page_count, parse_pdf_pages_generator
+
+# Parsing (page.get_text) and splitting are CPU-bound, so they run in worker
+# processes instead of on the API process. PARSE_WORKERS=0 disables the pool
+# and parses in-process. Documents longer than PARSE_PAGES_PER_TASK pages are
+# split into page ranges that are parsed in parallel.
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARSE_PAGES_PER_TASK = int(os.getenv("PARSE_PAGES_PER_TASK", "25"))
+PARSE_MAX_PENDING_TASKS = int(os.getenv("PARSE_MAX_PENDING_TASKS", str(max(2, PARSE_WORKERS))))
+# Workers are started with "spawn": forking the server, which runs uvicorn,
+# embedding and ingest threads, could copy locks held by those threads into
+# the children and deadlock them. "forkserver" also works on Unix.
+PARSE_START_METHOD = os.getenv("PARSE_START_METHOD", "spawn")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """
+    Returns the shared parse pool, or None when PARSE_WORKERS is 0. The app
+    creates it at startup (start_parse_pool); other callers create it on first use.
+    """
+    global _pool
+    if PARSE_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS,
+                                        mp_context=multiprocessing.get_context(PARSE_START_METHOD))
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def start_parse_pool():
+    """
+    Creates the parse pool and starts its workers, so the first upload does not pay for process start-up.
+    """
+    global _pool
+    pool = get_parse_pool()
+    if pool is None:
+        return
+    try:
+        # Workers start on demand; one no-op task per worker brings them all up now.
+        for future in [pool.submit(os.getpid) for _ in range(PARSE_WORKERS)]:
+            future.result()
+    except Exception as e:
+        # A pool that failed to start is dropped; the next document retries with a fresh one.
+        logging.warning(f"Parse pool failed to start: {e}")
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def chunk_page_range(path: str, start_page: int, end_page: int) -> tuple:
+    """
+    Worker entry point: parses pages [start_page, end_page) and returns
+    (page texts, chunks, parse seconds, chunk seconds). Chunk offsets are
+    relative to the range's own joined text.
+    """
+    started = time.perf_counter()
+    pages = list(parse_pdf_pages_generator(path, start_page, end_page))
+    parsed = time.perf_counter()
+    chunks = list(iter_chunk_records(pages, first_page=start_page))
+    return pages, chunks, parsed - started, time.perf_counter() - parsed
+
+
+class _StageTimer:
+    """
+    Accumulates the time spent inside next() of a wrapped iterator.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def wrap(self, iterable):
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.seconds += time.perf_counter() - started
+                return
+            self.seconds += time.perf_counter() - started
+            yield item
+
+
+def page_ranges(page_count: int, pages_per_task: int = PARSE_PAGES_PER_TASK) -> list:
+    if pages_per_task <= 0:
+        return [(0, page_count)]
+    return [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+
+
+def _report_pages(pages, on_pages):
+    for text in pages:
+        on_pages([text])
+        yield text
+
+
+def iter_document_chunks(source, on_pages=None):
+    """
+    Yields a document's chunks (extractor.Chunk records) in order. Pages are
+    joined with single spaces and chunk offsets index " ".join(pages).
+
+    When the process pool is enabled and source is a path, page ranges are
+    parsed in worker processes with at most PARSE_MAX_PENDING_TASKS ranges in
+    flight, so memory stays bounded for very large documents. Chunks do not
+    overlap across page-range boundaries.
+
+    Args:
+        source: Path to the PDF (or its bytes).
+        on_pages: Optional callback invoked with the texts of pages just parsed,
+            always before any chunk drawn from them is yielded.
+    """
+    pool = get_parse_pool()
+    if pool is None or isinstance(source, (bytes, bytearray)):
+        # Parsing and splitting interleave here, so each is timed by the time spent producing items.
+        parse_timer, total_timer = _StageTimer(), _StageTimer()
+        pages = parse_pdf_pages_generator(source)
+        if on_pages:
+            pages = _report_pages(pages, on_pages)
+        pages = parse_timer.wrap(pages)
+        yield from total_timer.wrap(iter_chunk_records(pages))
+        record("parse", parse_timer.seconds)
+        record("chunk", total_timer.seconds - parse_timer.seconds)
+        return
+
+    pending = deque()
+    offset = 0  # where the next range's text starts in the joined document text
+
+    def next_result():
+        nonlocal offset
+        pages, chunks, parse_seconds, chunk_seconds = pending.popleft().result()
+        record("parse", parse_seconds, payload_bytes=sum(len(text) for text in pages))
+        record("chunk", chunk_seconds)
+        if on_pages:
+            on_pages(pages)
+        base = offset
+        offset += sum(len(text) for text in pages) + len(PAGE_SEPARATOR) * len(pages)
+        return [chunk._replace(start=chunk.start + base, end=chunk.end + base) for chunk in chunks]
+
+    try:
+        for start, end in page_ranges(get_page_count(source)):
+            pending.append(pool.submit(chunk_page_range, source, start, end))
+            if len(pending) >= PARSE_MAX_PENDING_TASKS:
+                yield from next_result()
+        while pending:
+            yield from next_result()
+    finally:
+        for future in pending:
+            future.cancel()
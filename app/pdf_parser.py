@@ -1,16 +1,37 @@
 # app/pdf_parser.py
-import fitz  # PyMuPDF
 
-def parse_pdf_pages_generator(pdf_bytes: bytes):
+def open_pdf(source):
     """
-    Parses a PDF from bytes and yields text content page by page.
+    Opens a PDF from a file path or from bytes. Opening from a path lets
+    PyMuPDF load pages lazily instead of keeping the whole file in memory.
+    """
+    import fitz  # PyMuPDF, imported on first use to keep app start-up fast
+
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source, filetype="pdf")
+
+
+def get_page_count(source) -> int:
+    doc = open_pdf(source)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+def parse_pdf_pages_generator(source, start_page: int = 0, end_page: int = None):
+    """
+    Parses a PDF from a file path or bytes and yields text content page by page.
     This avoids holding the entire document's text in memory at once.
+    An optional [start_page, end_page) range limits parsing to part of the document.
     """
     doc = None
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        for page in doc:
-            yield page.get_text()
+        doc = open_pdf(source)
+        end_page = doc.page_count if end_page is None else min(end_page, doc.page_count)
+        for page_number in range(start_page, end_page):
+            yield doc[page_number].get_text()
     finally:
         if doc:
             doc.close() # Ensure the document is closed even if an error occurs
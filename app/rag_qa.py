@@ -3,25 +3,34 @@
 import os
 import requests
 import json
-from mistralai import Mistral
+from collections import deque
+from app.clients import get_mistral_client
 from app.startup import mistral_api
+from app.embedding_engine import EmbeddingEngine, EMBED_BATCH_SIZE, EMBED_MODEL, estimate_tokens
+from app.metrics import record, span
+from app.embedding_cache import EmbeddingCache, EMBED_CACHE_ENABLED, cache_key
+from app.rate_limit import RateLimiter
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Assuming you have a Mistral API key set as an environment variable
-api_key = os.getenv("MISTRAL_API_KEY")
-if not api_key:
-    raise ValueError("MISTRAL_API_KEY environment variable must be set.")
+# Batched, concurrent embedding engine shared by the ingest endpoints; it
+# resolves the shared Mistral client on its first call.
+embedding_engine = EmbeddingEngine(get_mistral_client)
 
-# Initialize the Mistral client globally for reusability
-client = Mistral(api_key=api_key)
+# Content-addressed on-disk cache consulted before any embeddings API call
+embedding_cache = EmbeddingCache() if EMBED_CACHE_ENABLED else None
+
+# Answer generations started by /ask/batch share this limit across all requests.
+ASK_REQUESTS_PER_SECOND = float(os.getenv("ASK_REQUESTS_PER_SECOND", "4"))
+ask_rate_limiter = RateLimiter(ASK_REQUESTS_PER_SECOND)
 
 
 def get_mistral_embedding(text: str) -> list:
     """
     Generates a vector embedding for a given text using the Mistral API client.
+    Cached embeddings are returned without calling the API.
 
     Args:
         text (str): The text to embed.
@@ -29,17 +38,122 @@ def get_mistral_embedding(text: str) -> list:
     Returns:
         list: The 1024-dimensional vector embedding.
     """
+    key = cache_key(EMBED_MODEL, text)
+    if embedding_cache:
+        cached = embedding_cache.get_many([key])[0]
+        if cached is not None:
+            return cached
     try:
-        embeddings_batch_response = client.embeddings.create(
-            model="mistral-embed",
-            inputs=[text]
-        )
-        return embeddings_batch_response.data[0].embedding
+        with span("embed", tokens=estimate_tokens(text), payload_bytes=len(text)):
+            embeddings_batch_response = get_mistral_client().embeddings.create(
+                model=EMBED_MODEL,
+                inputs=[text]
+            )
+        embedding = embeddings_batch_response.data[0].embedding
+        if embedding_cache:
+            embedding_cache.put_many([key], [embedding])
+        return embedding
     except Exception as e:
         print(f"Error getting Mistral embedding: {e}")
         return None
 
 
+def _embed_with_span(texts: list) -> list:
+    tokens = sum(estimate_tokens(text) for text in texts)
+    with span("embed", tokens=tokens, payload_bytes=sum(len(text) for text in texts)):
+        return embedding_engine.embed(texts)
+
+
+def get_mistral_embeddings(texts: list) -> list:
+    """
+    Generates embeddings for many texts using batched, concurrent API calls.
+    Only texts missing from the embedding cache are sent to the API.
+
+    Args:
+        texts (list): The texts to embed.
+
+    Returns:
+        list: One embedding per text, in the same order.
+
+    Raises:
+        EmbeddingError: If any batch could not be embedded after retries.
+    """
+    if not embedding_cache:
+        return _embed_with_span(texts)
+
+    keys = [cache_key(EMBED_MODEL, text) for text in texts]
+    embeddings = embedding_cache.get_many(keys)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        fresh = _embed_with_span([texts[i] for i in missing])
+        embedding_cache.put_many([keys[i] for i in missing], fresh)
+        for i, embedding in zip(missing, fresh):
+            embeddings[i] = embedding
+    return embeddings
+
+
+def iter_mistral_embeddings(texts):
+    """
+    Embeds an iterable of texts of unknown length and yields one embedding per
+    text, in order. Cached embeddings are looked up as texts arrive; the rest
+    are packed into token-bounded batches with up to EMBED_CONCURRENCY API calls
+    in flight.
+
+    Raises:
+        EmbeddingError: If any batch could not be embedded after retries.
+    """
+    # (cache key, cached embedding or None) for every text read so far.
+    pending = deque()
+
+    def uncached(texts):
+        group = []
+        for text in texts:
+            group.append(text)
+            if len(group) >= EMBED_BATCH_SIZE:
+                yield from lookup(group)
+                group = []
+        yield from lookup(group)
+
+    def lookup(group):
+        if not group:
+            return
+        keys = [cache_key(EMBED_MODEL, text) for text in group]
+        cached = embedding_cache.get_many(keys) if embedding_cache else [None] * len(group)
+        for key, text, embedding in zip(keys, group, cached):
+            pending.append((key, embedding))
+            if embedding is None:
+                yield text
+
+    for batch, fresh, seconds in embedding_engine.embed_stream(uncached(texts)):
+        record("embed", seconds, sum(estimate_tokens(text) for text in batch), sum(len(text) for text in batch))
+        embeddings = []
+        keys = []
+        while len(keys) < len(fresh):
+            key, embedding = pending.popleft()
+            if embedding is None:
+                embedding = fresh[len(keys)]
+                keys.append(key)
+            embeddings.append(embedding)
+        if embedding_cache:
+            embedding_cache.put_many(keys, fresh)
+        yield from embeddings
+    while pending:
+        yield pending.popleft()[1]
+
+
+def get_embedding_cache_stats() -> dict:
+    """
+    Returns hit/miss counters for the embedding cache.
+    """
+    if not embedding_cache:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_cache.stats()}
+
+
+def build_question_prompt(context: str, question: str) -> str:
+    return f"Answer the following question based on the context:\n\nContext:\n{context}\n\nQuestion: {question}"
+
+
 def ask_question(context: str, question: str):
     """
     Answers a question by generating a response with the Mistral API.
@@ -52,7 +166,7 @@ def ask_question(context: str, question: str):
         str: The AI-generated answer.
     """
     # Create the full prompt for the Mistral API
-    prompt = f"Answer the following question based on the context:\n\nContext:\n{context}\n\nQuestion: {question}"
+    prompt = build_question_prompt(context, question)
 
     # Use the client to make a chat completion API call
     try:
@@ -60,4 +174,12 @@ def ask_question(context: str, question: str):
         return chat_response
     except Exception as e:
         print(f"Error calling Mistral API: {e}")
-        return f"Error calling Mistral API: {e}"
\ No newline at end of file
+        return f"Error calling Mistral API: {e}"
+
+
+def ask_question_limited(context: str, question: str):
+    """
+    ask_question, spaced by the shared ask rate limiter.
+    """
+    with ask_rate_limiter:
+        return ask_question(context, question)
\ No newline at end of file
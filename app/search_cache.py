@@ -0,0 +1,139 @@
+# search_cache.py
+
+import functools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Fresh entries are served for SEARCH_CACHE_TTL seconds. After that they are
+# still served for up to SEARCH_CACHE_STALE_TTL more seconds while a single
+# background refresh replaces them. Each provider keeps at most
+# SEARCH_CACHE_MAX_ENTRIES results.
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_STALE_TTL = float(os.getenv("SEARCH_CACHE_STALE_TTL", "86400"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512"))
+
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search-refresh")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(str(query).lower().split())
+
+
+class SearchResultCache:
+    """
+    In-process LRU cache with TTL, stale-while-revalidate and request coalescing.
+    Only values returned by a successful fetch are stored: a fetch that raises
+    is never cached, and a failed background refresh leaves the last good
+    value in place until it expires.
+    """
+
+    def __init__(self, name: str, ttl: float = SEARCH_CACHE_TTL, stale_ttl: float = SEARCH_CACHE_STALE_TTL,
+                 max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _fetch(self, key, fetch, future: Future):
+        try:
+            value = fetch()
+            self._store(key, value)
+            future.set_result(value)
+        except Exception as e:
+            logging.warning(f"Search provider '{self.name}' fetch failed: {e}")
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _start_fetch(self, key):
+        """
+        Returns (future, is_owner). Must be called with the lock held.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            return future, False
+        future = Future()
+        self._inflight[key] = future
+        return future, True
+
+    def get(self, key, fetch):
+        """
+        Returns the cached value for key, calling fetch() at most once across
+        concurrent callers when the entry is missing or fully expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                if age <= self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    future, is_owner = self._start_fetch(key)
+                    if is_owner:
+                        _refresh_executor.submit(self._fetch, key, fetch, future)
+                    return entry[1]
+            self.misses += 1
+            future, is_owner = self._start_fetch(key)
+
+        if is_owner:
+            self._fetch(key, fetch, future)
+        return future.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "entries": size,
+        }
+
+
+search_caches = {}
+
+
+def cached_search(name: str):
+    """
+    Decorates a provider search function (query, max_results) with a result cache.
+    The function must raise on provider errors; whatever it returns is cached.
+    """
+    cache = search_caches.setdefault(name, SearchResultCache(name))
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(query, max_results=5):
+            key = (normalize_query(query), int(max_results))
+            return cache.get(key, lambda: fn(query, max_results))
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def get_search_cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in search_caches.items()}
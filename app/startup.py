@@ -1,25 +1,45 @@
 import os
 from dotenv import load_dotenv
-from mistralai import Mistral
+
+from app.clients import get_mistral_client
+from app.metrics import span, usage_tokens
 
 load_dotenv()
 api_key = os.getenv("MISTRAL_API_KEY")
 model = "ministral-8b-2410"
 
-client = Mistral(api_key=api_key)
-
 def mistral_api(prompt):
-    chat_response = client.chat.complete(
-    model= model,
-    messages = [
-        {
-            "role": "system",
-            "content":  "You are an expert academic assistant. Your task is to provide responses as per user request. You will strictly structure your response in Markdown format. End your response with: ### END",
-            
-            "role": "user",
-            "content": f"{prompt}",
-        },
-    ]
-    )
+    with span("generate", payload_bytes=len(prompt)) as generate:
+        chat_response = get_mistral_client().chat.complete(
+        model= model,
+        messages = [
+            {
+                "role": "system",
+                "content":  "You are an expert academic assistant. Your task is to provide responses as per user request. You will strictly structure your response in Markdown format. End your response with: ### END",
+                
+                "role": "user",
+                "content": f"{prompt}",
+            },
+        ]
+        )
+        generate.tokens = usage_tokens(chat_response)
+
+    return(chat_response.choices[0].message.content)
 
-    return(chat_response.choices[0].message.content)
\ No newline at end of file
+async def mistral_api_stream(prompt):
+    """
+    Streams a chat completion for the prompt, yielding text deltas as they arrive.
+    Leaving the generator early closes the upstream connection, which stops generation.
+    """
+    # Same message mistral_api sends: its dict literal collapses to the user entry.
+    with span("generate", payload_bytes=len(prompt)) as generate:
+        response = await get_mistral_client().chat.stream_async(
+            model=model,
+            messages=[{"role": "user", "content": f"{prompt}"}],
+        )
+        async with response as events:
+            async for event in events:
+                generate.tokens = usage_tokens(event.data) or generate.tokens
+                delta = event.data.choices[0].delta.content if event.data.choices else None
+                if delta:
+                    yield delta
@@ -0,0 +1,56 @@
+# streaming.py
+
+import json
+import logging
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+
+def sse_event(data: dict, event: str = None) -> str:
+    """
+    Formats one server-sent event.
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def single_delta(text: str):
+    """
+    Wraps an already available result as a one-item delta stream.
+    """
+    yield text
+
+
+async def sse_from_deltas(request: Request, deltas, on_complete=None):
+    """
+    Forwards text deltas as `data: {"delta": ...}` events, then a `done` event.
+
+    The upstream generator is closed as soon as the client disconnects, so an
+    abandoned request stops consuming tokens. on_complete(full_text) runs only
+    when the stream finished normally.
+    """
+    collected = []
+    try:
+        async for delta in deltas:
+            if await request.is_disconnected():
+                logging.info(f"Client disconnected from {request.url.path}; cancelling stream.")
+                return
+            collected.append(delta)
+            yield sse_event({"delta": delta})
+        if on_complete:
+            on_complete("".join(collected))
+        yield sse_event({}, event="done")
+    except Exception as e:
+        logging.error(f"Error while streaming {request.url.path}: {e}", exc_info=True)
+        yield sse_event({"error": str(e)}, event="error")
+    finally:
+        await deltas.aclose()
+
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,133 @@
+# summarizer.py
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.completion_cache import completion_cache, content_key
+from app.metrics import propagate_context
+from app.rate_limit import RateLimiter
+from app.startup import mistral_api, model
+
+# Chunks are packed into groups of about SUMMARY_GROUP_CHARS characters; each
+# group is summarised on its own (map) and the partial summaries are merged
+# (reduce), recursively if they are still too long for one prompt.
+SUMMARY_GROUP_CHARS = int(os.getenv("SUMMARY_GROUP_CHARS", "12000"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_REQUESTS_PER_SECOND = float(os.getenv("SUMMARY_REQUESTS_PER_SECOND", "2"))
+SUMMARY_MAX_REDUCE_LEVELS = 4
+
+_PROMPT_VERSION = "v1"
+
+MAP_PROMPT = """
+You are an expert research assistant.
+The following text is one section of a longer research paper.
+Summarise the key insights, findings, methods, data and contributions it contains.
+Keep concrete details such as numbers, datasets and named methods. Do not add information.
+
+Section text:
+\"\"\"
+{text}
+\"\"\"
+
+Output:
+"""
+
+REDUCE_PROMPT = """
+You are an expert research assistant.
+The following are summaries of consecutive sections of one research paper.
+Merge them into a single summary without losing concrete details. Remove repetition.
+
+Section summaries:
+\"\"\"
+{text}
+\"\"\"
+
+Output:
+"""
+
+rate_limiter = RateLimiter(SUMMARY_REQUESTS_PER_SECOND)
+
+
+def group_chunks(chunks: list, max_chars: int = SUMMARY_GROUP_CHARS) -> list:
+    """
+    Packs consecutive chunks into text groups of at most max_chars characters.
+    """
+    groups = []
+    current = []
+    size = 0
+    for chunk in chunks:
+        if current and size + len(chunk) > max_chars:
+            groups.append("\n".join(current))
+            current = []
+            size = 0
+        current.append(chunk)
+        size += len(chunk) + 1
+    if current:
+        groups.append("\n".join(current))
+    return groups
+
+
+def _cached_completion(template: str, text: str) -> str:
+    """
+    Runs a rate-limited completion, reusing any previous result for identical input.
+    """
+    key = content_key(_PROMPT_VERSION, model, template, text)
+    cached = completion_cache.get(key)
+    if cached is not None:
+        return cached
+    with rate_limiter:
+        output = mistral_api(template.format(text=text)).strip()
+    completion_cache.put(key, output)
+    return output
+
+
+def _map(template: str, groups: list) -> list:
+    if len(groups) == 1:
+        return [_cached_completion(template, groups[0])]
+    with ThreadPoolExecutor(max_workers=min(SUMMARY_CONCURRENCY, len(groups))) as executor:
+        return list(executor.map(propagate_context(lambda text: _cached_completion(template, text)), groups))
+
+
+def reduce_chunks(chunks: list) -> str:
+    """
+    Runs the map and reduce passes and returns the text the final prompt is applied to:
+    the document itself if it fits in one group, otherwise the merged partial summaries.
+    """
+    groups = group_chunks(chunks)
+    if len(groups) <= 1:
+        return groups[0] if groups else ""
+
+    partials = _map(MAP_PROMPT, groups)
+    level = 1
+    while len(groups := group_chunks(partials)) > 1 and level <= SUMMARY_MAX_REDUCE_LEVELS:
+        logging.info(f"Reducing {len(partials)} partial summaries (level {level}).")
+        partials = _map(REDUCE_PROMPT, groups)
+        level += 1
+    return "\n".join(partials)
+
+
+def cached_final_summary(final_prompt: str, text: str):
+    """
+    Returns a previously generated final response for this prompt and text, if any.
+    """
+    return completion_cache.get(content_key(_PROMPT_VERSION, model, final_prompt, text))
+
+
+def store_final_summary(final_prompt: str, text: str, output: str):
+    completion_cache.put(content_key(_PROMPT_VERSION, model, final_prompt, text), output.strip())
+
+
+def summarize_chunks(chunks: list, final_prompt: str) -> str:
+    """
+    Hierarchical map-reduce summary of a document's chunks.
+
+    Args:
+        chunks (list): The document's chunks in order.
+        final_prompt (str): Prompt template with a {text} placeholder, applied
+            to the whole document if it fits or to the merged summaries otherwise.
+
+    Returns:
+        str: The model's final response.
+    """
+    return _cached_completion(final_prompt, reduce_chunks(chunks))
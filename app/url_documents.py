@@ -0,0 +1,328 @@
+# url_documents.py
+
+import hashlib
+import ipaddress
+import logging
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.ingest import file_sha256, ingest_pdf
+
+# PDFs behind /extract_from_url/ and /ask_url_paper/ are downloaded once, kept
+# in a bounded on-disk cache and ingested like uploads, so follow-up requests
+# are answered from retrieved chunks instead of having the model re-read the
+# document. A cached copy is trusted for URL_CACHE_REVALIDATE_SECONDS, then
+# revalidated with a conditional GET (ETag / Last-Modified).
+URL_CACHE_DIR = os.getenv("URL_CACHE_DIR", os.path.join(".cache", "url_documents"))
+URL_CACHE_MAX_BYTES = int(os.getenv("URL_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+URL_CACHE_REVALIDATE_SECONDS = float(os.getenv("URL_CACHE_REVALIDATE_SECONDS", "3600"))
+URL_DOWNLOAD_TIMEOUT = float(os.getenv("URL_DOWNLOAD_TIMEOUT", "30"))
+URL_MAX_DOWNLOAD_BYTES = int(os.getenv("URL_MAX_DOWNLOAD_BYTES", str(100 * 1024 * 1024)))
+URL_MAX_REDIRECTS = int(os.getenv("URL_MAX_REDIRECTS", "5"))
+# Only public addresses are fetched, so user-supplied URLs cannot reach the
+# metadata service, localhost or internal hosts such as the Chroma server.
+# Each request connects directly (not through a proxy) to the address that
+# was checked, so the host cannot be re-resolved to another one in between.
+# Set to true for local development against a test server.
+URL_ALLOW_PRIVATE_ADDRESSES = os.getenv("URL_ALLOW_PRIVATE_ADDRESSES", "false").lower() in ("1", "true", "yes")
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UnsupportedUrlDocument(ValueError):
+    """Raised when a URL does not point to a PDF that can be downloaded and ingested."""
+
+
+class BlockedUrlError(ValueError):
+    """Raised when a URL, or a redirect it leads to, targets a non-public address."""
+
+
+def check_public_url(url: str):
+    """
+    Rejects URLs that are not http(s) or whose host resolves to any private,
+    loopback, link-local, reserved or otherwise non-global address.
+
+    Returns:
+        str: The checked address to connect to, or None when private
+        addresses are allowed and the host is resolved as usual.
+
+    Raises:
+        BlockedUrlError: If the URL must not be fetched.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise BlockedUrlError(f"Only http(s) URLs can be downloaded: {url}")
+    if URL_ALLOW_PRIVATE_ADDRESSES:
+        return None
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        infos = socket.getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, ValueError) as e:
+        raise BlockedUrlError(f"Could not resolve the host of {url}: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise BlockedUrlError(f"{url} resolves to the non-public address {address}.")
+    return infos[0][4][0]
+
+
+class _PinnedAddressAdapter(HTTPAdapter):
+    """
+    Connects to an address checked by check_public_url instead of resolving
+    the host again. TLS still sends and verifies the original host name.
+    """
+
+    def __init__(self, address: str):
+        super().__init__()
+        self.address = address
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        host_params, pool_kwargs = self.build_connection_pool_key_attributes(request, verify, cert)
+        hostname = host_params["host"]
+        host_params["host"] = self.address
+        if host_params["scheme"] == "https":
+            pool_kwargs["server_hostname"] = hostname
+            pool_kwargs["assert_hostname"] = hostname
+        return self.poolmanager.connection_from_host(**host_params, pool_kwargs=pool_kwargs)
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.strip().encode("utf-8")).hexdigest()
+
+
+def url_title(url: str) -> str:
+    """
+    Document title used when indexing a URL: stable per URL and recognisable in listings.
+    """
+    return f"url {url_key(url)[:16]}"
+
+
+class UrlDocumentCache:
+    """
+    On-disk cache of downloaded URL documents with their HTTP validators,
+    evicting least recently used files beyond max_bytes.
+    """
+
+    def __init__(self, directory: str = URL_CACHE_DIR, max_bytes: int = URL_CACHE_MAX_BYTES,
+                 revalidate_seconds: float = URL_CACHE_REVALIDATE_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self.hits = 0
+        self.revalidated = 0
+        self.downloads = 0
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._session = requests.Session()
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT NOT NULL,
+                byte_size INTEGER NOT NULL,
+                validated_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    @contextmanager
+    def _url_lock(self, key: str):
+        """
+        Serialises work on one URL. Locks only exist while in use, so keys present
+        in _url_locks are exactly those being fetched or ingested.
+        """
+        with self._lock:
+            entry = self._url_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._url_locks[key]
+
+    def _entry(self, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, content_hash, validated_at FROM documents WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or not os.path.exists(self._path(key)):
+            return None
+        return {"etag": row[0], "last_modified": row[1], "content_hash": row[2], "validated_at": row[3]}
+
+    def _touch(self, key: str, validated: bool = False):
+        now = time.time()
+        with self._lock:
+            if validated:
+                self._db.execute("UPDATE documents SET last_used = ?, validated_at = ? WHERE key = ?", (now, now, key))
+            else:
+                self._db.execute("UPDATE documents SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+
+    def _download(self, url: str, key: str, response) -> dict:
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as f:
+                for block in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    if size == 0 and not block.startswith(b"%PDF") and content_type != "application/pdf":
+                        raise UnsupportedUrlDocument(f"{url} is not a PDF (Content-Type '{content_type}').")
+                    size += len(block)
+                    if size > URL_MAX_DOWNLOAD_BYTES:
+                        raise UnsupportedUrlDocument(f"{url} is larger than {URL_MAX_DOWNLOAD_BYTES} bytes.")
+                    f.write(block)
+            if not size:
+                raise UnsupportedUrlDocument(f"{url} returned an empty document.")
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        now = time.time()
+        entry = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified"),
+                 "content_hash": file_sha256(self._path(key)), "validated_at": now}
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (key, url, etag, last_modified, content_hash, byte_size, "
+                "validated_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, entry["etag"], entry["last_modified"], entry["content_hash"], size, now, now),
+            )
+            self._db.commit()
+        self.downloads += 1
+        self._evict(keep=key)
+        return entry
+
+    def _evict(self, keep: str):
+        with self._lock:
+            (total,) = self._db.execute("SELECT COALESCE(SUM(byte_size), 0) FROM documents").fetchone()
+            if total <= self.max_bytes:
+                return
+            rows = self._db.execute(
+                "SELECT key, byte_size FROM documents WHERE key != ? ORDER BY last_used", (keep,)
+            ).fetchall()
+            for key, byte_size in rows:
+                if total <= self.max_bytes:
+                    break
+                if key in self._url_locks:
+                    continue  # being fetched or ingested right now
+                self._db.execute("DELETE FROM documents WHERE key = ?", (key,))
+                if os.path.exists(self._path(key)):
+                    os.remove(self._path(key))
+                total -= byte_size
+            self._db.commit()
+
+    def fetch(self, url: str) -> tuple:
+        """
+        Returns (path, content_hash) of a local copy of the PDF at url, downloading
+        it only when there is no cached copy or the server reports a new version.
+
+        Raises:
+            BlockedUrlError: If the URL or a redirect targets a non-public address.
+            UnsupportedUrlDocument: If the URL does not serve a PDF.
+            requests.RequestException: If the download fails.
+        """
+        with self._url_lock(url_key(url)):
+            return self._fetch(url)
+
+    def _get(self, url: str, headers: dict):
+        """
+        GETs url, following at most URL_MAX_REDIRECTS redirects by hand so that
+        every hop is checked before it is requested.
+        """
+        for _ in range(URL_MAX_REDIRECTS + 1):
+            address = check_public_url(url)
+            if address is None:
+                response = self._session.get(url, headers=headers, stream=True, timeout=URL_DOWNLOAD_TIMEOUT,
+                                             allow_redirects=False)
+            else:
+                # The connection goes to the checked address; the Host header keeps the name.
+                request = self._session.prepare_request(requests.Request(
+                    "GET", url, headers={**headers, "Host": urlparse(url).netloc.rsplit("@", 1)[-1]}
+                ))
+                settings = self._session.merge_environment_settings(url, {}, True, None, None)
+                response = _PinnedAddressAdapter(address).send(request, stream=True, timeout=URL_DOWNLOAD_TIMEOUT,
+                                                               verify=settings["verify"], cert=settings["cert"])
+            if not response.is_redirect:
+                return response
+            location = response.headers.get("Location")
+            response.close()
+            url = urljoin(url, location)
+        raise UnsupportedUrlDocument(f"Too many redirects (more than {URL_MAX_REDIRECTS}).")
+
+    def _fetch(self, url: str) -> tuple:
+        check_public_url(url)
+        key = url_key(url)
+        entry = self._entry(key)
+        if entry and time.time() - entry["validated_at"] < self.revalidate_seconds:
+            self.hits += 1
+            self._touch(key)
+            return self._path(key), entry["content_hash"]
+
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        with self._get(url, headers) as response:
+            if response.status_code == 304 and entry:
+                self.revalidated += 1
+                self._touch(key, validated=True)
+                return self._path(key), entry["content_hash"]
+            response.raise_for_status()
+            entry = self._download(url, key, response)
+        return self._path(key), entry["content_hash"]
+
+    def index(self, url: str, chroma_handler) -> str:
+        """
+        Makes sure the PDF at url is downloaded and indexed, returning its title slug.
+        Unchanged documents are not re-ingested.
+
+        URL documents are hidden from library listings and library-wide retrieval;
+        they are only reachable through their URL (or title slug).
+
+        Raises:
+            BlockedUrlError: If the URL or a redirect targets a non-public address.
+            UnsupportedUrlDocument: If the URL does not serve a PDF.
+        """
+        with self._url_lock(url_key(url)):
+            path, content_hash = self._fetch(url)
+            title = url_title(url)
+            title_slug, entry = chroma_handler.find_document(title)
+            if entry and entry["chunk_count"] and entry["content_hash"] == content_hash:
+                return title_slug
+            logging.info(f"Indexing document from {url} as '{title}'.")
+            chroma_handler.hide_document(title_slug)
+            return ingest_pdf(path, title, chroma_handler, filename=url)["doc_title"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(byte_size), 0) FROM documents").fetchone()
+        return {"documents": count, "bytes": total, "hits": self.hits, "revalidated": self.revalidated,
+                "downloads": self.downloads}
+
+
+url_document_cache = UrlDocumentCache()
+
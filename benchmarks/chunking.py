@@ -0,0 +1,152 @@
+# chunking.py
+"""
+Chunker benchmark: the native page/section-aware chunker against the
+LangChain RecursiveCharacterTextSplitter it replaced.
+
+Both chunk the same pre-parsed pages of a synthetic PDF, so only splitting
+is measured. The LangChain baseline is run the two ways the app used it:
+streaming (re-splitting a growing buffer) and whole-document (joining every
+page, then create_documents). Reports wall time, throughput, peak Python
+allocations (tracemalloc) and chunk size statistics.
+
+Usage:
+    python -m benchmarks.chunking
+    python -m benchmarks.chunking --pages 2000 --repeat 5
+    python -m benchmarks.chunking --pdf paper.pdf
+    python -m benchmarks.chunking --wrap 50      # two-column line lengths
+
+Requires langchain-text-splitters for the baseline runs; they are skipped
+when it is not installed.
+"""
+
+import argparse
+import gc
+import os
+import statistics
+import tempfile
+import textwrap
+import time
+import tracemalloc
+
+from app.extractor import CHUNK_OVERLAP, CHUNK_SIZE, iter_chunk_records
+from app.pdf_parser import parse_pdf_pages_generator
+from benchmarks.fakes import make_synthetic_pdf
+
+
+def _langchain_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                                          length_function=len, is_separator_regex=False)
+
+
+def langchain_streaming(pages) -> list:
+    """
+    The previous extractor.iter_chunks: buffer 16 chunks of text, split, keep the last chunk.
+    """
+    splitter = _langchain_splitter()
+    window = CHUNK_SIZE * 16
+    chunks = []
+    buffer = ""
+    for segment in pages:
+        buffer = f"{buffer} {segment}" if buffer else segment
+        if len(buffer) < window:
+            continue
+        split = splitter.split_text(buffer)
+        if len(split) < 2:
+            continue
+        chunks.extend(split[:-1])
+        buffer = split[-1]
+    if buffer:
+        chunks.extend(splitter.split_text(buffer))
+    return chunks
+
+
+def langchain_whole_document(pages) -> list:
+    """
+    The previous extractor.extract_and_chunk_text: join all pages, then create_documents.
+    """
+    documents = _langchain_splitter().create_documents([" ".join(pages)])
+    return [document.page_content for document in documents]
+
+
+def native(pages) -> list:
+    return [chunk.text for chunk in iter_chunk_records(pages)]
+
+
+def measure(name: str, fn, pages: list, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        chunks = fn(iter(pages))
+        times.append(time.perf_counter() - started)
+    # Allocations are traced in a separate run; tracing slows Python code down unevenly.
+    gc.collect()
+    tracemalloc.start()
+    fn(iter(pages))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    characters = sum(len(page) for page in pages)
+    sizes = [len(chunk) for chunk in chunks]
+    best = min(times)
+    return {
+        "name": name,
+        "seconds": round(best, 4),
+        "mb_per_s": round(characters / best / 1e6, 2),
+        "peak_mb": round(peak / 1e6, 2),
+        "chunks": len(chunks),
+        "mean_chars": round(statistics.mean(sizes)) if sizes else 0,
+        "min_chars": min(sizes, default=0),
+        "max_chars": max(sizes, default=0),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=500, help="Synthetic PDF page count.")
+    parser.add_argument("--pdf", help="Benchmark this PDF instead of a synthetic one.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per chunker; the fastest is reported.")
+    parser.add_argument("--wrap", type=int, default=0,
+                        help="Re-wrap page text to lines of this many characters (0 keeps the parsed lines).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    path = args.pdf
+    cleanup = None
+    if not path:
+        fd, cleanup = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        path = make_synthetic_pdf(cleanup, args.pages, seed=1)
+    try:
+        pages = list(parse_pdf_pages_generator(path))
+    finally:
+        if cleanup:
+            os.remove(cleanup)
+    if args.wrap:
+        pages = ["\n".join(textwrap.wrap(page.replace("\n", " "), args.wrap)) for page in pages]
+    print(f"{len(pages)} pages, {sum(len(page) for page in pages) / 1e6:.2f} M characters, "
+          f"chunk size {CHUNK_SIZE}, overlap {CHUNK_OVERLAP}")
+
+    runs = [("native", native)]
+    try:
+        _langchain_splitter()
+        runs += [("langchain_streaming", langchain_streaming), ("langchain_whole_document", langchain_whole_document)]
+    except ImportError:
+        print("langchain-text-splitters is not installed; skipping the baseline runs.")
+
+    results = [measure(name, fn, pages, args.repeat) for name, fn in runs]
+    columns = ("name", "seconds", "mb_per_s", "peak_mb", "chunks", "mean_chars", "min_chars", "max_chars")
+    widths = [max(len(column), *(len(str(result[column])) for result in results)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[column]).ljust(width) for column, width in zip(columns, widths)))
+    for result in results[1:]:
+        print(f"native is {result['seconds'] / results[0]['seconds']:.1f}x faster than {result['name']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
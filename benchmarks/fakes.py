@@ -0,0 +1,248 @@
+# fakes.py
+
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+from requests.adapters import BaseAdapter
+
+WORDS = ("model data results analysis method network learning training performance evaluation sample "
+         "distribution feature signal error baseline approach dataset experiment accuracy study effect "
+         "variable measure structure process system theory review framework").split()
+
+
+class _TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def fake_embedding(text: str, dimension: int) -> list:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeMistralServer:
+    """
+    Local HTTP server speaking the subset of the Mistral API the app uses:
+    chat completions (plain and streamed) and embeddings.
+
+    Each request sleeps for `latency` seconds (plus `token_latency` per streamed
+    token), and requests beyond `requests_per_second` are answered with 429.
+    """
+
+    def __init__(self, latency: float = 0.05, token_latency: float = 0.002, requests_per_second: float = 0,
+                 completion_tokens: int = 120, dimension: int = 1024):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.completion_tokens = completion_tokens
+        self.dimension = dimension
+        self.bucket = _TokenBucket(requests_per_second)
+        self.counts = {"chat": 0, "embeddings": 0, "rate_limited": 0}
+        self._counts_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-mistral", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, key: str, n: int = 1):
+        with self._counts_lock:
+            self.counts[key] += n
+
+    def completion_text(self, prompt: str) -> str:
+        rng = random.Random(prompt)
+        return " ".join(rng.choice(WORDS) for _ in range(self.completion_tokens)) + "\n### END"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not fake.bucket.take():
+                    fake._count("rate_limited")
+                    self._send_json(429, {"object": "error", "message": "Requests rate limit exceeded"})
+                    return
+                time.sleep(fake.latency)
+                if self.path.endswith("/embeddings"):
+                    self._embeddings(request)
+                elif self.path.endswith("/chat/completions"):
+                    self._chat(request)
+                else:
+                    self._send_json(404, {"object": "error", "message": f"Unknown path {self.path}"})
+
+            def _embeddings(self, request: dict):
+                inputs = request.get("inputs") or request.get("input") or []
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                fake._count("embeddings")
+                tokens = sum(len(text.split()) for text in inputs)
+                self._send_json(200, {
+                    "id": "embd-fake", "object": "list", "model": request.get("model", "mistral-embed"),
+                    "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text, fake.dimension)}
+                             for i, text in enumerate(inputs)],
+                    "usage": {"prompt_tokens": tokens, "completion_tokens": 0, "total_tokens": tokens},
+                })
+
+            def _chat(self, request: dict):
+                fake._count("chat")
+                prompt = json.dumps(request.get("messages", []))
+                text = fake.completion_text(prompt)
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": fake.completion_tokens,
+                         "total_tokens": len(prompt) // 4 + fake.completion_tokens}
+                base = {"id": "cmpl-fake", "model": request.get("model", "fake"), "created": int(time.time())}
+                if not request.get("stream"):
+                    time.sleep(fake.token_latency * fake.completion_tokens)
+                    self._send_json(200, {**base, "object": "chat.completion", "usage": usage, "choices": [
+                        {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}]})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                pieces = text.split(" ")
+                for i, piece in enumerate(pieces):
+                    time.sleep(fake.token_latency)
+                    last = i == len(pieces) - 1
+                    chunk = {**base, "object": "chat.completion.chunk", "choices": [
+                        {"index": 0, "delta": {"content": piece + ("" if last else " ")},
+                         "finish_reason": "stop" if last else None}]}
+                    if last:
+                        chunk["usage"] = usage
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+# Canned provider bodies, shaped like the real arXiv, Semantic Scholar, CORE and PubMed responses.
+_ARXIV = ("<?xml version='1.0' encoding='UTF-8'?><feed xmlns='http://www.w3.org/2005/Atom'>{entries}</feed>")
+_ARXIV_ENTRY = "<entry><id>http://arxiv.org/abs/{i}</id><title>{title}</title><summary>{summary}</summary></entry>"
+_CORE = "<html><body>{results}</body></html>"
+_CORE_RESULT = "<div class='result-title'><a href='/works/{i}'>{title}</a></div>"
+
+
+class CannedSearchAdapter(BaseAdapter):
+    """
+    requests transport adapter answering the paper search providers from canned
+    bodies after a fixed latency, so /search_papers/ runs without the network.
+    """
+
+    def __init__(self, latency: float = 0.1, results: int = 5):
+        super().__init__()
+        self.latency = latency
+        self.results = results
+
+    def _body(self, url: str):
+        titles = [f"Synthetic paper {i} on {WORDS[i % len(WORDS)]}" for i in range(self.results)]
+        if "arxiv.org" in url:
+            entries = "".join(_ARXIV_ENTRY.format(i=i, title=t, summary=f"Abstract of {t}.")
+                              for i, t in enumerate(titles))
+            return "application/atom+xml", _ARXIV.format(entries=entries)
+        if "semanticscholar.org" in url:
+            data = [{"title": t, "url": f"https://example.org/{i}", "abstract": f"Abstract of {t}."}
+                    for i, t in enumerate(titles)]
+            return "application/json", json.dumps({"data": data})
+        if "core.ac.uk" in url:
+            return "text/html", _CORE.format(results="".join(_CORE_RESULT.format(i=i, title=t)
+                                                             for i, t in enumerate(titles)))
+        if "esearch" in url:
+            return "application/json", json.dumps({"esearchresult": {"idlist": [str(i) for i in range(self.results)]}})
+        if "esummary" in url:
+            result = {str(i): {"title": t, "source": "Synthetic Journal"} for i, t in enumerate(titles)}
+            return "application/json", json.dumps({"result": result})
+        return "text/plain", ""
+
+    def send(self, request, **kwargs):
+        time.sleep(self.latency)
+        content_type, body = self._body(request.url)
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = content_type
+        response._content = body.encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def make_synthetic_pdf(path: str, pages: int, seed: int = 0, references: int = 30) -> str:
+    """
+    Writes a text PDF of the given page count: paragraphs of filler prose and a
+    numbered reference list on the last page. Different seeds give different text.
+    """
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        if page_number == pages - 1:
+            lines = ["References"] + [
+                f"[{i + 1}] Author{rng.randint(1, 999)}, A. ({rng.randint(1990, 2024)}). "
+                f"A study of {rng.choice(WORDS)} {rng.choice(WORDS)}. Journal of {rng.choice(WORDS).title()}, "
+                f"{rng.randint(1, 40)}({rng.randint(1, 12)}), {rng.randint(1, 300)}-{rng.randint(301, 600)}."
+                for i in range(references)
+            ]
+            text = "\n".join(lines)
+        else:
+            paragraphs = []
+            for _ in range(6):
+                paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(60, 90))) + ".")
+            text = f"Section {page_number + 1}\n" + "\n\n".join(paragraphs)
+        page.insert_textbox(fitz.Rect(50, 50, 545, 800), text, fontsize=8)
+    doc.save(path)
+    doc.close()
+    return path
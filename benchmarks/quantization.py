@@ -0,0 +1,136 @@
+# quantization.py
+"""
+Vector quantization benchmark: recall, memory and latency of the local
+vector store with VECTOR_QUANTIZATION none, float16, int8 and pq.
+
+Clustered synthetic vectors (the shape of real embeddings: many near
+neighbours per topic) are added to one LocalCollection per mode in a
+temporary directory. Queries are perturbed copies of stored vectors. Recall@k
+is measured against brute-force float32 search over all vectors, both for
+whole-library queries and for queries restricted to one document. The
+collection runs with its production settings, so whole-library queries use
+the IVF index from VECTOR_IVF_MIN_VECTORS vectors on (--ivf-min-vectors).
+
+Usage:
+    python -m benchmarks.quantization
+    python -m benchmarks.quantization --vectors 200000 --rescore-min 2048
+    python -m benchmarks.quantization --modes int8 pq --subvectors 128
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+import app.vector_store as vector_store
+from app.vector_store import LocalCollection
+
+MODES = ("none", "float16", "int8", "pq")
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, size=count)
+    vectors = centres[assignment] + 0.35 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def fill(collection: LocalCollection, vectors: np.ndarray, documents: int, batch: int = 5000):
+    for start in range(0, len(vectors), batch):
+        rows = range(start, min(start + batch, len(vectors)))
+        collection.add(ids=[f"v{i}" for i in rows], embeddings=vectors[start:rows.stop],
+                       metadatas=[{"doc_title": f"doc{i % documents}"} for i in rows])
+
+
+def run_queries(collection: LocalCollection, queries: np.ndarray, k: int, where_titles: list) -> tuple:
+    results, latencies = [], []
+    for query, title in zip(queries, where_titles):
+        where = {"doc_title": title} if title else None
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, where=where, include=[])
+        latencies.append(time.perf_counter() - started)
+        results.append(result["ids"][0])
+    return results, latencies
+
+
+def recall(found: list, exact: list) -> float:
+    return statistics.mean(len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(found, exact))
+
+
+def exact_results(vectors: np.ndarray, queries: np.ndarray, k: int, where_titles: list, documents: int) -> list:
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    results = []
+    for query, title in zip(queries, where_titles):
+        rows = np.arange(len(vectors)) if title is None else np.arange(int(title[3:]), len(vectors), documents)
+        distances = norms[rows] - 2.0 * (vectors[rows] @ query)
+        results.append([f"v{rows[i]}" for i in np.argsort(distances)[:k]])
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--vectors", type=int, default=50000, help="Stored vectors.")
+    parser.add_argument("--dim", type=int, default=1024, help="Vector dimension (mistral-embed uses 1024).")
+    parser.add_argument("--documents", type=int, default=100, help="doc_title partitions the vectors are spread over.")
+    parser.add_argument("--clusters", type=int, default=500, help="Topic clusters in the synthetic data.")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per scope.")
+    parser.add_argument("--k", type=int, default=10, help="Results per query; recall@k is reported.")
+    parser.add_argument("--rescore-factor", type=int, default=vector_store.VECTOR_RESCORE_FACTOR,
+                        help="Candidates rescored exactly, as a multiple of k.")
+    parser.add_argument("--rescore-min", type=int, default=vector_store.VECTOR_RESCORE_MIN_CANDIDATES,
+                        help="Minimum candidates rescored exactly (0 uses each codec's default).")
+    parser.add_argument("--ivf-min-vectors", type=int, default=vector_store.VECTOR_IVF_MIN_VECTORS,
+                        help="Library size from which whole-library queries use the IVF index.")
+    parser.add_argument("--subvectors", type=int, default=vector_store.VECTOR_PQ_SUBVECTORS,
+                        help="PQ subvectors (bytes per vector).")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    vector_store.VECTOR_PQ_SUBVECTORS = args.subvectors
+    vector_store.VECTOR_RESCORE_MIN_CANDIDATES = args.rescore_min
+    vector_store.VECTOR_IVF_MIN_VECTORS = args.ivf_min_vectors
+    vectors = synthetic_vectors(args.vectors, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    picked = rng.choice(args.vectors, size=args.queries, replace=False)
+    queries = vectors[picked] + 0.05 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    scopes = {"library": [None] * args.queries,
+              "document": [f"doc{i % args.documents}" for i in picked]}
+    exact = {scope: exact_results(vectors, queries, args.k, titles, args.documents) for scope, titles in scopes.items()}
+    print(f"{args.vectors} vectors x {args.dim} dims in {args.documents} documents, {args.queries} queries per scope, "
+          f"recall@{args.k}, IVF {'on' if args.vectors >= args.ivf_min_vectors else 'off'}, "
+          f"rescore pool max({args.k} x {args.rescore_factor}, {args.rescore_min or 'codec minimum'}, sqrt(n))")
+
+    results = []
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as directory:
+            collection = LocalCollection(directory, quantization=mode, rescore_factor=args.rescore_factor)
+            started = time.perf_counter()
+            fill(collection, vectors, args.documents)
+            collection.query(query_embeddings=[queries[0].tolist()], n_results=args.k, include=[])  # builds codes
+            collection.build_index()  # normally built in the background
+            build_seconds = time.perf_counter() - started
+            stats = collection.memory_stats()
+            row = {"mode": mode, "build_s": round(build_seconds, 2),
+                   "search_B/vec": stats["search_bytes_per_vector"], "disk_B/vec": stats["disk_bytes_per_vector"]}
+            for scope, titles in scopes.items():
+                found, latencies = run_queries(collection, queries, args.k, titles)
+                row[f"{scope}_recall"] = round(recall(found, exact[scope]), 4)
+                row[f"{scope}_p50_ms"] = round(statistics.median(latencies) * 1000, 2)
+            results.append(row)
+
+    columns = list(dict.fromkeys(column for row in results for column in row))
+    widths = [max(len(column), *(len(str(row.get(column, "-"))) for row in results)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in results:
+        print("  ".join(str(row.get(column, "-")).ljust(width) for column, width in zip(columns, widths)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
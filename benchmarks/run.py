@@ -0,0 +1,371 @@
+# run.py
+"""
+Offline benchmarks for the API hot paths.
+
+Runs /upload/, /upload_multiple/, /ask/, /extract/, /citations/ and
+/search_papers/ in-process against local stand-ins: a fake Mistral server
+(configurable latency and rate limit), an in-process vector store, canned
+paper search responses and synthetic PDFs. Reports throughput, p50/p95/p99
+latency and peak RSS per stage; a baseline can be saved and later compared
+against to catch regressions.
+
+Usage:
+    python -m benchmarks.run
+    python -m benchmarks.run --stages ask,search --iterations 50 --concurrency 8
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --compare          # exits 1 on regression
+
+Peak RSS covers this process only; PDF parsing in the process pool
+(PARSE_WORKERS > 0) is not included.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.fakes import CannedSearchAdapter, FakeMistralServer, make_synthetic_pdf
+
+STAGES = ("upload", "upload_multiple", "ask", "extract", "citations", "search")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SEARCH_HOSTS = ("http://export.arxiv.org", "https://api.semanticscholar.org", "https://core.ac.uk",
+                "https://eutils.ncbi.nlm.nih.gov")
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class RssSampler:
+    """
+    Samples the process RSS in a background thread and keeps the peak.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = _rss_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, _rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, _rss_bytes())
+
+
+async def run_stage(name: str, requests: list, concurrency: int, server: FakeMistralServer) -> dict:
+    """
+    Runs request coroutine factories with bounded concurrency and summarises them.
+    Each factory returns True on success.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def timed(factory):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await factory()
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    calls_before = dict(server.counts)
+    with RssSampler() as memory:
+        started = time.perf_counter()
+        await asyncio.gather(*(timed(factory) for factory in requests))
+        wall = time.perf_counter() - started
+
+    ms = np.asarray(latencies) * 1000
+    return {
+        "stage": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "peak_rss_mb": round(memory.peak_rss / 2 ** 20, 1),
+        "rss_growth_mb": round((memory.peak_rss - memory.start_rss) / 2 ** 20, 1),
+        "upstream_calls": {key: server.counts[key] - calls_before[key] for key in server.counts},
+    }
+
+
+class Benchmark:
+    def __init__(self, args, client, server: FakeMistralServer, pdf_dir: str):
+        self.args = args
+        self.client = client
+        self.server = server
+        self.pdf_dir = pdf_dir
+        self._seed = 0
+        self._documents = []
+
+    def new_pdf(self, pages: int) -> str:
+        self._seed += 1
+        path = os.path.join(self.pdf_dir, f"bench_{pages}p_{self._seed}.pdf")
+        return make_synthetic_pdf(path, pages, seed=self._seed)
+
+    async def upload(self, path: str, title: str) -> bool:
+        with open(path, "rb") as f:
+            response = await self.client.post("/upload/", files={"file": (f"{title}.pdf", f.read(), "application/pdf")})
+        return response.status_code == 200
+
+    async def documents(self, count: int) -> list:
+        """
+        Uploads (outside any measurement) enough documents for per-document stages.
+        """
+        while len(self._documents) < count:
+            title = f"bench doc {len(self._documents)}"
+            if not await self.upload(self.new_pdf(self.args.document_pages), title):
+                raise RuntimeError(f"Setup upload of '{title}' failed.")
+            self._documents.append(title.replace(" ", "_"))
+        return self._documents[:count]
+
+    async def stage_upload(self) -> list:
+        results = []
+        for pages in self.args.sizes:
+            paths = [self.new_pdf(pages) for _ in range(self.args.upload_iterations)]
+            requests = [lambda p=p: self.upload(p, os.path.splitext(os.path.basename(p))[0]) for p in paths]
+            results.append(await run_stage(f"upload[{pages}p]", requests, self.args.concurrency, self.server))
+        return results
+
+    async def stage_upload_multiple(self) -> list:
+        pages = min(self.args.sizes)
+
+        async def upload_batch(paths):
+            files = []
+            for path in paths:
+                with open(path, "rb") as f:
+                    files.append(("files", (os.path.basename(path), f.read(), "application/pdf")))
+            response = await self.client.post("/upload_multiple/", files=files)
+            return response.status_code == 200 and not any(
+                str(title).startswith("Error") for title in response.json().get("doc_titles", []))
+
+        batches = [[self.new_pdf(pages) for _ in range(self.args.batch_size)]
+                   for _ in range(self.args.upload_iterations)]
+        requests = [lambda b=b: upload_batch(b) for b in batches]
+        name = f"upload_multiple[{self.args.batch_size}x{pages}p]"
+        return [await run_stage(name, requests, self.args.concurrency, self.server)]
+
+    async def stage_ask(self) -> list:
+        (title,) = await self.documents(1)
+        topics = ("accuracy", "training", "baseline", "the dataset", "signal error", "evaluation")
+
+        async def ask(i):
+            # Distinct questions, so the answer cache does not short-circuit the pipeline.
+            question = f"What does the paper report about {topics[i % len(topics)]} in experiment {i}?"
+            response = await self.client.post("/ask/", json={"title": title, "question": question})
+            return response.status_code == 200 and not response.json()["answer"].startswith("Error")
+
+        requests = [lambda i=i: ask(i) for i in range(self.args.iterations)]
+        return [await run_stage("ask", requests, self.args.concurrency, self.server)]
+
+    async def stage_extract(self) -> list:
+        titles = await self.documents(self.args.llm_iterations)
+
+        async def extract(title):
+            response = await self.client.get("/extract/", params={"title": title})
+            return response.status_code == 200 and "Failed" not in response.json().get("extracted_info", "Failed")
+
+        requests = [lambda t=t: extract(t) for t in titles]
+        return [await run_stage("extract", requests, self.args.concurrency, self.server)]
+
+    async def stage_citations(self) -> list:
+        titles = await self.documents(self.args.llm_iterations)
+
+        async def citations(title):
+            response = await self.client.post("/citations/", json={"title": title, "style": "APA"})
+            return response.status_code == 200 and "citations" in response.json()
+
+        requests = [lambda t=t: citations(t) for t in titles]
+        return [await run_stage("citations", requests, self.args.concurrency, self.server)]
+
+    async def stage_search(self) -> list:
+        async def search(i):
+            # Unique queries, so every request fans out to the providers instead of the search cache.
+            response = await self.client.get("/search_papers/", params={"query": f"benchmark query {i} {time.time()}"})
+            return response.status_code == 200 and all(response.json().values())
+
+        requests = [lambda i=i: search(i) for i in range(self.args.iterations)]
+        return [await run_stage("search", requests, self.args.concurrency, self.server)]
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """
+    Returns regression messages: p95 latency above, or throughput below, the baseline by more than tolerance.
+    """
+    previous = {entry["stage"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        base = previous.get(entry["stage"])
+        if not base:
+            continue
+        if entry["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{entry['stage']}: p95 {entry['p95_ms']} ms vs baseline {base['p95_ms']} ms")
+        if entry["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{entry['stage']}: throughput {entry['throughput_rps']} req/s "
+                               f"vs baseline {base['throughput_rps']} req/s")
+        if entry["errors"] > base["errors"]:
+            regressions.append(f"{entry['stage']}: {entry['errors']} errors vs baseline {base['errors']}")
+    return regressions
+
+
+def print_report(results: list):
+    header = f"{'stage':<28}{'reqs':>6}{'errs':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}" \
+             f"{'peak MB':>10}{'+MB':>8}  upstream"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        upstream = ", ".join(f"{key}={value}" for key, value in r["upstream_calls"].items() if value)
+        print(f"{r['stage']:<28}{r['requests']:>6}{r['errors']:>6}{r['throughput_rps']:>9}{r['p50_ms']:>10}"
+              f"{r['p95_ms']:>10}{r['p99_ms']:>10}{r['peak_rss_mb']:>10}{r['rss_growth_mb']:>8}  {upstream}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {', '.join(STAGES)}.")
+    parser.add_argument("--iterations", type=int, default=40, help="Requests per /ask/ and /search_papers/ stage.")
+    parser.add_argument("--upload-iterations", type=int, default=4, help="Uploads per PDF size.")
+    parser.add_argument("--llm-iterations", type=int, default=6,
+                        help="Documents for /extract/ and /citations/ (each is requested once).")
+    parser.add_argument("--sizes", default="5,30,120", help="Synthetic PDF page counts for /upload/.")
+    parser.add_argument("--document-pages", type=int, default=12, help="Page count of documents used by /ask/ etc.")
+    parser.add_argument("--batch-size", type=int, default=4, help="PDFs per /upload_multiple/ request.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake Mistral per-request latency (s).")
+    parser.add_argument("--token-latency", type=float, default=0.001, help="Fake Mistral per-token latency (s).")
+    parser.add_argument("--rps", type=float, default=0, help="Fake Mistral rate limit (requests/s, 0 = none).")
+    parser.add_argument("--search-latency", type=float, default=0.1, help="Canned search provider latency (s).")
+    parser.add_argument("--vector-backend", default=None, choices=("memory", "local"),
+                        help="In-process Chroma ('memory', needs chromadb) or the local store. "
+                             "Defaults to memory when chromadb is installed.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline; exit 1 on regression.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", help="Also write the results as JSON to this path.")
+    args = parser.parse_args(argv)
+    args.stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+    if args.vector_backend is None:
+        try:
+            import chromadb  # noqa: F401
+            args.vector_backend = "memory"
+        except ImportError:
+            args.vector_backend = "local"
+    return args
+
+
+async def main_async(args, server: FakeMistralServer, pdf_dir: str) -> list:
+    import httpx
+
+    from app import main as app_main
+    from app import paper_search
+
+    adapter = CannedSearchAdapter(latency=args.search_latency)
+    for host in SEARCH_HOSTS:
+        paper_search.session.mount(host, adapter)
+
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+        bench = Benchmark(args, client, server, pdf_dir)
+        results = []
+        for stage in STAGES:
+            if stage in args.stages:
+                print(f"Running {stage}...", file=sys.stderr)
+                results.extend(await getattr(bench, f"stage_{stage}")())
+        return results
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    server = FakeMistralServer(latency=args.latency, token_latency=args.token_latency,
+                               requests_per_second=args.rps).start()
+    workdir = tempfile.mkdtemp(prefix="scholar-bench-")
+    pdf_dir = os.path.join(workdir, "pdfs")
+    os.makedirs(pdf_dir)
+
+    # Every cache and store defaults to ./.cache, so running from a scratch
+    # directory keeps the benchmark isolated. The environment must be set
+    # before the app is imported.
+    os.chdir(workdir)
+    os.environ.update({
+        "MISTRAL_API_KEY": "benchmark",
+        "MISTRAL_SERVER_URL": server.url,
+        "VECTOR_BACKEND": args.vector_backend,
+    })
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+
+    try:
+        results = asyncio.run(main_async(args, server, pdf_dir))
+    finally:
+        server.stop()
+
+    print_report(results)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {key: value for key, value in vars(args).items()
+                     if key not in ("baseline", "save_baseline", "compare", "output")},
+        "results": results,
+    }
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {baseline_path}")
+    if args.compare:
+        if not os.path.exists(baseline_path):
+            print(f"No baseline at {baseline_path}; run with --save-baseline first.")
+            return 1
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())